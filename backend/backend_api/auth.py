@@ -1,7 +1,7 @@
 # backend_api/auth.py
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from db.mongo_handler import create_user, get_user_by_email
+from db.async_repository import create_user, get_user_by_email, login_child_by_email
 
 router = APIRouter()
 
@@ -16,18 +16,18 @@ class LoginRequest(BaseModel):
     role: str  # Added to verify role match
 
 @router.post("/auth/signup")
-def signup(req: SignupRequest):
-    existing = get_user_by_email(req.email)
+async def signup(req: SignupRequest):
+    existing = await get_user_by_email(req.email)
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
     # Save raw password for now (no hashing)
-    create_user(req.email, req.password, req.role)
+    await create_user(req.email, req.password, req.role)
     return {"message": "Signup successful"}
 
 @router.post("/auth/login")
-def login(req: LoginRequest):
-    user = get_user_by_email(req.email)
+async def login(req: LoginRequest):
+    user = await get_user_by_email(req.email)
     if not user or user["password_hash"] != req.password or user["role"] != req.role:
         raise HTTPException(status_code=401, detail="Invalid credentials or mismatched role")
 
@@ -39,8 +39,7 @@ def login(req: LoginRequest):
 
     # For child users, include child info from DB
     if user["role"] == "child":
-        from db.mongo_handler import login_child_by_email
-        child_data = login_child_by_email(req.email)
+        child_data = await login_child_by_email(req.email)
         if child_data:
             response.update({
                 "child_id": child_data["child_id"],
@@ -1,18 +1,28 @@
-from fastapi import APIRouter, HTTPException
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from core.prompt_builder import (
     get_questions_for_age, convert_to_first_person, format_question, build_question_prompt, 
-    build_system_instruction, build_analysis_prompt, build_explanation_prompt, extract_option_from_llm_response
+    build_system_instruction, build_analysis_prompt, build_turn_analysis_prompt, build_explanation_template,
+    explanation_substitutions, extract_option_from_llm_response
 
 )   
-from services.llm_chat import query_llm
-from db.mongo_handler import store_response, create_or_resume_test, login_child_by_code
-from db.vector_store import embed_text, store_vector
+from services.llm_dispatcher import query_llm, stream_llm, llm_turn_budget, LLMUnavailable
+from services.llm_cache import cached_query, llm_cache_stats
+from services.speculation import speculate_next_turn
+from db.async_repository import (
+    store_response, create_or_resume_test, login_child_by_code, get_test_status, get_test_by_id
+)
+from db.accessors import TEST_CONFIRM
+from db.vector_store import store_turn_vector
 from core.context_tracker import extract_context, update_super_context
+from core.turn_context import build_turn_context
+from core.session_store import append_messages, replace_messages, get_messages, question_window
 import uuid
-from utils.intent_classifier import detect_user_intent
-from db.mongo_handler import get_test_by_id, mark_test_submitted
+from utils.intent_classifier import detect_and_analyze, get_intent_stats
 
 router = APIRouter()
 
@@ -27,13 +37,21 @@ class StartRequest(BaseModel):
 class RespondRequest(BaseModel):
     age: int
     question_index: int
-    chat_history: List[Dict[str, str]]
+    # Send either just the new message (history is kept server-side per test_id)
+    # or, as older clients do, the full chat_history on every turn
+    message: Optional[str] = None
+    chat_history: Optional[List[Dict[str, str]]] = None
     child_name: str
     child_id: str  # Required for grouping
     respondent_type: Optional[str] = "parent"  # Made optional with default
     suggested_option: Optional[str] = None
     test_id: str  # Required - created in /start
 
+    def incoming_message(self) -> str:
+        if self.message is not None:
+            return self.message
+        return self.chat_history[-1]["content"] if self.chat_history else ""
+
 class ConfirmOptionRequest(BaseModel):
     test_id: str
     child_id: str
@@ -41,14 +59,15 @@ class ConfirmOptionRequest(BaseModel):
     question_index: int
     selected_option: str
     respondent_type: Optional[str] = "parent"  # Made optional with default
+    child_name: Optional[str] = None  # Falls back to the name stored on the test
 
 @router.post("/start")
-def start_test(req: StartRequest):
+async def start_test(req: StartRequest):
     try:
         # Validate child using either child_id or child_code
         if req.child_code:
             # Parent/Teacher using sharing code
-            child_data = login_child_by_code(req.child_code)
+            child_data = await login_child_by_code(req.child_code)
             if not child_data:
                 raise HTTPException(status_code=400, detail="Invalid child code. Please verify the code.")
             
@@ -66,7 +85,7 @@ def start_test(req: StartRequest):
             raise HTTPException(status_code=400, detail="Either child_id or child_code is required")
         
         # Create new test or resume existing incomplete test
-        test_result = create_or_resume_test(
+        test_result = await create_or_resume_test(
             child_id=child_id,
             age=age,
             child_name=child_name,
@@ -89,155 +108,309 @@ def start_test(req: StartRequest):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/respond")
-async def respond(req: RespondRequest):
+def stamp_question_indexes(stored: List[Dict], resent: List[Dict], question_index: int) -> List[Dict]:
+    """
+    Question indexes for a resent history: messages matching the stored conversation keep
+    their recorded index, only the ones from the first difference on get the current one
+    """
+    def same(a: Dict, b: Dict) -> bool:
+        return a.get("role") == b.get("role") and (a.get("content") or "").strip() == (b.get("content") or "").strip()
+
+    stamped, matching = [], True
+    for i, message in enumerate(resent):
+        matching = matching and i < len(stored) and same(stored[i], message)
+        index = stored[i].get("question_index", question_index) if matching else question_index
+        stamped.append(dict(message, question_index=index))
+    return stamped
+
+def load_turn_history(req: RespondRequest):
+    """Record the incoming message server-side; returns the prompt window and the message's turn key"""
+    if req.message is not None:
+        messages, version = append_messages(req.test_id, [
+            {"role": "user", "content": req.message, "question_index": req.question_index}
+        ])
+    else:
+        # Legacy shape: the client resent the whole conversation
+        messages, version = replace_messages(req.test_id, stamp_question_indexes(
+            get_messages(req.test_id), req.chat_history or [], req.question_index
+        ))
+    # The session version is per-test monotonic, so a resumed test (whose resent history starts
+    # over from the greeting) never reuses the key of an earlier message
+    return question_window(messages, req.question_index), version
+
+def record_reply(test_id: str, result: dict):
+    if result.get("message"):
+        append_messages(test_id, [
+            {"role": "assistant", "content": result["message"].strip(), "question_index": result.get("question_index")}
+        ])
+
+async def generate(prompt: str, stream: Optional[asyncio.Queue] = None) -> str:
+    """Full LLM reply; when a stream queue is given, each chunk is also forwarded as it arrives"""
+    if stream is None:
+        return await query_llm(prompt)
+    chunks = []
+    async for chunk in stream_llm(prompt):
+        chunks.append(chunk)
+        await stream.put(chunk)
+    return "".join(chunks)
+
+async def analyze(req: RespondRequest, turn, analysis=None, stream: Optional[asyncio.Queue] = None):
+    """
+    LLM analysis of an open-ended answer -> (message, suggested option). Reuses the combined
+    intent call's reply when there is one; falls back to keyword rules when the LLM is unavailable.
+    """
+    if analysis is not None:
+        return f"{analysis.reply.strip()}\n\n", analysis.suggested_option
+
+    prompt = build_analysis_prompt(
+        age=req.age,
+        question_index=turn.question_index,
+        chat_history=turn.chat_history,
+        child_name=req.child_name,
+        respondent_type=req.respondent_type,
+        formatted_messages=turn.formatted_history
+    )
     try:
-        if not req.test_id or not req.child_id:
-            raise HTTPException(status_code=400, detail="Missing test_id or child_id")
-
-        test_data = get_test_by_id(req.test_id)
-        if test_data.get("submitted"):
-            return {
-                "message": "This test has already been submitted. No further responses are needed.",
-                "completed": True,
-                "question_index": None
-            }
-
-        questions = get_questions_for_age(req.age)
-        index = req.question_index
-        user_msg = req.chat_history[-1]["content"].strip() if req.chat_history else ""
+        llm_output = await generate(prompt, stream)
+    except LLMUnavailable as e:
+        print(f"[Chat] LLM unavailable, suggesting from keywords: {e}")
+        suggested = turn.extracted_option
+        return f"Thanks for sharing that. It sounds like '{suggested}' might fit best. Does that sound right?", suggested
+    return f"{llm_output.strip()}\n\n", extract_option_from_llm_response(llm_output)
+
+async def handle_turn(req: RespondRequest, turn, questions: List[str], stream: Optional[asyncio.Queue] = None) -> dict:
+    """All LLM calls of one turn share a latency/token budget (see services/llm_dispatcher.py)"""
+    with llm_turn_budget():
+        return await _handle_turn(req, turn, questions, stream)
+
+async def _handle_turn(req: RespondRequest, turn, questions: List[str], stream: Optional[asyncio.Queue] = None) -> dict:
+    index = turn.question_index
+
+    # ▶️ Start test if index = -1 and user agrees
+    if index == -1 and any(x in turn.normalized_text for x in ["yes", "start", "go", "ready", "begin"]):
+        first_q = questions[0]
+        q_text = build_question_prompt(first_q, req.child_name, req.respondent_type)
+        speculate_next_turn(req.test_id, req.age, 0, req.child_name, req.respondent_type)
+        return {
+            "message": q_text,
+            "question_index": 0,
+            "child_id": req.child_id,
+            "test_id": req.test_id,
+            "respondent_type": req.respondent_type
+        }
 
-        if not user_msg:
-            return {"message": "Can you share more about this?", "question_index": index}
+    # ✅ End of test check - FIXED: Don't mark as submitted here
+    if index is None or index >= len(questions):
+        return {
+            "message": "Thank you for completing all questions! You can now submit your test responses.",
+            "question_index": None,
+            "completed": True,
+            "test_id": req.test_id
+        }
 
-        # ⏺️ Store vector representation for review
-        vector = embed_text(user_msg)
-        store_vector(req.test_id, max(0, index), vector, user_msg)
+    # 🧠 Detect user intent (rules → embedding centroids → LLM). When the LLM is needed, one call
+    # also returns the suggested option and reply used by the analysis branches below. A JSON
+    # reply cannot be streamed token by token, so streamed turns keep the separate intent and
+    # (streamed) analysis calls.
+    user_intent, analysis = await detect_and_analyze(turn, None if stream is not None else lambda: build_turn_analysis_prompt(
+        age=req.age,
+        question_index=index,
+        chat_history=turn.chat_history,
+        child_name=req.child_name,
+        respondent_type=req.respondent_type,
+        formatted_messages=turn.formatted_history
+    ))
+
+    current_question = questions[index]
+
+    # --- Intent-based handling ---
+    if user_intent == "confused" or user_intent == "asking_question":
+        # Explanations depend only on the question and respondent type, so they are cached
+        explain_prompt = build_explanation_template(current_question, req.respondent_type)
+        try:
+            explanation = await cached_query(explain_prompt, explanation_substitutions(req.child_name), stream)
+        except LLMUnavailable as e:
+            print(f"[Chat] LLM unavailable, using the generic explanation: {e}")
+            explanation = ("Think about how things have usually been over the last six months. "
+                           "Pick 'Not True' if it rarely or never applies, 'Somewhat True' if it applies "
+                           "sometimes, and 'Certainly True' if it applies most of the time.")
+        return {
+            "message": f"No worries! {explanation.strip()}\n\nSo how would you answer: Not True / Somewhat True / Certainly True?",
+            "question_index": index,
+            "child_id": req.child_id,
+            "test_id": req.test_id
+        }
 
-        # ▶️ Start test if index = -1 and user agrees
-        if index == -1 and any(x in user_msg.lower() for x in ["yes", "start", "go", "ready", "begin"]):
-            first_q = questions[0]
-            q_text = build_question_prompt(first_q, req.child_name, req.respondent_type)
-            return {
-                "message": q_text,
-                "question_index": 0,
-                "child_id": req.child_id,
-                "test_id": req.test_id,
-                "respondent_type": req.respondent_type
-            }
+    elif user_intent == "confirmation" and req.suggested_option:
+        final_option = extract_option_from_llm_response(req.suggested_option)
+        await store_response(req.test_id, index, current_question, final_option)
 
-        # ✅ End of test check - FIXED: Don't mark as submitted here
-        if index is None or index >= len(questions):
+        next_index = index + 1
+        if next_index >= len(questions):
+            # FIXED: Don't mark as submitted, just return completion message
             return {
-                "message": "Thank you for completing all questions! You can now submit your test responses.",
+                "message": "Perfect! That was the last question. All questions completed! You can now submit your test responses.",
                 "question_index": None,
-                "completed": True,
-                "test_id": req.test_id
+                "completed": True
             }
 
-        # 🧠 Detect user intent
-        user_intent = detect_user_intent(req.chat_history)
+        next_q = questions[next_index]
+        next_q_prompt = build_question_prompt(next_q, req.child_name, req.respondent_type)
+        speculate_next_turn(req.test_id, req.age, next_index, req.child_name, req.respondent_type)
+        return {
+            "message": f"Great! Next question:\n\n{next_q_prompt}",
+            "question_index": next_index,
+            "suggested_option": None
+        }
 
-        current_question = questions[index]
+    elif user_intent == "correction":
+        # Re-analyze from new input
+        message, new_suggestion = await analyze(req, turn, analysis, stream)
+        return {
+            "message": message,
+            "question_index": index,
+            "suggested_option": new_suggestion
+        }
 
-        # --- Intent-based handling ---
-        if user_intent == "confused" or user_intent == "asking_question":
-            explain_prompt = build_explanation_prompt(current_question, req.child_name, req.respondent_type)
-            explanation = query_llm(explain_prompt)
-            return {
-                "message": f"No worries! {explanation.strip()}\n\nSo how would you answer: Not True / Somewhat True / Certainly True?",
-                "question_index": index,
-                "child_id": req.child_id,
-                "test_id": req.test_id
-            }
+    elif user_intent == "direct_answer":
+        suggested = turn.extracted_option
+        return {
+            "message": f"Got it – sounds like '{suggested}'. Does that sound right?",
+            "question_index": index,
+            "suggested_option": suggested,
+            "child_id": req.child_id,
+            "test_id": req.test_id,
+            "respondent_type": req.respondent_type
+        }
 
-        elif user_intent == "confirmation" and req.suggested_option:
-            final_option = extract_option_from_llm_response(req.suggested_option)
-            store_response(req.test_id, index, current_question, final_option)
-
-            next_index = index + 1
-            if next_index >= len(questions):
-                # FIXED: Don't mark as submitted, just return completion message
-                return {
-                    "message": "Perfect! That was the last question. All questions completed! You can now submit your test responses.",
-                    "question_index": None,
-                    "completed": True
-                }
-
-            next_q = questions[next_index]
-            next_q_prompt = build_question_prompt(next_q, req.child_name, req.respondent_type)
-            return {
-                "message": f"Great! Next question:\n\n{next_q_prompt}",
-                "question_index": next_index,
-                "suggested_option": None
-            }
+    elif user_intent == "sharing_experience" or user_intent == "unclear":
+        # Treat like open-ended input — analyze with LLM
+        message, suggested = await analyze(req, turn, analysis, stream)
+        return {
+            "message": message,
+            "question_index": index,
+            "suggested_option": suggested
+        }
 
-        elif user_intent == "correction":
-            # Re-analyze from new input
-            prompt = build_analysis_prompt(
-                age=req.age,
-                question_index=index,
-                chat_history=req.chat_history,
-                child_name=req.child_name,
-                respondent_type=req.respondent_type
-            )
-            llm_output = query_llm(prompt)
-            new_suggestion = extract_option_from_llm_response(llm_output)
-            return {
-                "message": f"{llm_output.strip()}\n\n",
-                "question_index": index,
-                "suggested_option": new_suggestion
-            }
+    # Fallback
+    return {
+        "message": "Sorry, I didn't understand that. Could you say it again?",
+        "question_index": index
+    }
+
+async def prepare_turn(req: RespondRequest):
+    """
+    Checks shared by /respond and /respond/stream.
+    Returns (early_result, None, None) when the turn needs no further handling, else (None, turn, questions).
+    """
+    if not req.test_id or not req.child_id:
+        raise HTTPException(status_code=400, detail="Missing test_id or child_id")
+
+    test_data = await get_test_status(req.test_id)
+    if test_data.get("submitted"):
+        return {
+            "message": "This test has already been submitted. No further responses are needed.",
+            "completed": True,
+            "question_index": None
+        }, None, None
 
-        elif user_intent == "direct_answer":
-            suggested = extract_option_from_llm_response(user_msg)
-            return {
-                "message": f"Got it – sounds like '{suggested}'. Does that sound right?",
-                "question_index": index,
-                "suggested_option": suggested,
-                "child_id": req.child_id,
-                "test_id": req.test_id,
-                "respondent_type": req.respondent_type
-            }
+    index = req.question_index
+    if not req.incoming_message().strip():
+        return {"message": "Can you share more about this?", "question_index": index}, None, None
 
-        elif user_intent == "sharing_experience" or user_intent == "unclear":
-            # Treat like open-ended input — analyze with LLM
-            prompt = build_analysis_prompt(
-                age=req.age,
-                question_index=index,
-                chat_history=req.chat_history,
-                child_name=req.child_name,
-                respondent_type=req.respondent_type
-            )
-            llm_output = query_llm(prompt)
-            suggested = extract_option_from_llm_response(llm_output)
-            return {
-                "message": f"{llm_output.strip()}\n\n",
-                "question_index": index,
-                "suggested_option": suggested
-            }
+    questions = get_questions_for_age(req.age)
+    window, turn_index = await asyncio.to_thread(load_turn_history, req)
+    return None, build_turn_context(req.test_id, index, window, turn_index), questions
 
-        # Fallback
-        return {
-            "message": "Sorry, I didn't understand that. Could you say it again?",
-            "question_index": index
-        }
+@router.post("/respond")
+async def respond(req: RespondRequest, background_tasks: BackgroundTasks):
+    try:
+        early, turn, questions = await prepare_turn(req)
+        if early is not None:
+            return early
+
+        # ⏺️ Store vector representation for review (after the response is sent, so the
+        # embedding computed by the intent classifier is reused when there is one)
+        background_tasks.add_task(store_turn_vector, turn)
 
+        result = await handle_turn(req, turn, questions)
+        # Recorded before responding, so a client's next turn always finds the reply in the history
+        await asyncio.to_thread(record_reply, req.test_id, result)
+        return result
+
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+def ndjson(frame: dict) -> str:
+    return json.dumps(frame, default=str) + "\n"
+
+@router.post("/respond/stream")
+async def respond_stream(req: RespondRequest, background_tasks: BackgroundTasks):
+    """
+    Same turn handling as /respond, streamed as NDJSON frames:
+      {"type": "token", "text": "..."}   LLM output as it is generated (correction, sharing_experience,
+                                         unclear and explanation turns only)
+      {"type": "final", ...}             the full /respond payload (message, question_index, suggested_option)
+      {"type": "error", "detail": "..."} if the turn failed after streaming started
+    """
+    try:
+        early, turn, questions = await prepare_turn(req)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if early is None:
+        background_tasks.add_task(store_turn_vector, turn)
+
+    async def frames():
+        if early is not None:
+            yield ndjson({"type": "final", **early})
+            return
+
+        queue = asyncio.Queue()
+        task = asyncio.create_task(handle_turn(req, turn, questions, stream=queue))
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield ndjson({"type": "token", "text": getter.result()})
+                    continue
+                getter.cancel()
+                # Drain chunks that arrived together with completion
+                while not queue.empty():
+                    yield ndjson({"type": "token", "text": queue.get_nowait()})
+                break
+
+            result = task.result()
+            await asyncio.to_thread(record_reply, req.test_id, result)
+            yield ndjson({"type": "final", **result})
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield ndjson({"type": "error", "detail": str(e)})
+        finally:
+            # Client disconnected mid-stream: stop generating
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(frames(), media_type="application/x-ndjson")
+
 
 @router.post("/confirm-option")
-def confirm_option(req: ConfirmOptionRequest):
+async def confirm_option(req: ConfirmOptionRequest):
 
     try:
         questions = get_questions_for_age(req.age)
         if req.question_index >= len(questions):
             raise HTTPException(status_code=400, detail="Invalid question index.")
 
-        test_data = get_test_by_id(req.test_id)
+        test_data = await get_test_by_id(req.test_id, TEST_CONFIRM)
         if test_data.get("submitted"):
             return {
                 "message": "This test has already been submitted.",
@@ -246,7 +419,7 @@ def confirm_option(req: ConfirmOptionRequest):
             }
 
         question = questions[req.question_index]
-        store_response(
+        await store_response(
             test_id=req.test_id,
             question_index=req.question_index,
             question=question,
@@ -265,8 +438,11 @@ def confirm_option(req: ConfirmOptionRequest):
                 "respondent_type": req.respondent_type
             }
 
-        next_question = get_questions_for_age(req.age)[next_index]
-        next_prompt = build_question_prompt(next_question, req.child_name, req.respondent_type)
+        next_question = questions[next_index]
+        child_name = req.child_name or test_data.get("child_name") or "the child"
+        next_prompt = build_question_prompt(next_question, child_name, req.respondent_type)
+        # Prepare the explanation and warm the LLM while the user reads the question
+        speculate_next_turn(req.test_id, req.age, next_index, child_name, req.respondent_type)
 
         return {
             "message": f"Next question:\n\n{next_prompt}",
@@ -278,4 +454,16 @@ def confirm_option(req: ConfirmOptionRequest):
         }
 
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/intent-stats")
+def intent_stats():
+    """How often each intent tier (rules / centroid / llm) resolved a turn"""
+    return get_intent_stats()
+
+
+@router.get("/llm-cache-stats")
+def llm_cache_stats_route():
+    """Hit rate of the in-process explanation cache"""
+    return llm_cache_stats()
@@ -1,7 +1,7 @@
 # backend_api/child.py
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from db.mongo_handler import register_child, login_child_by_code, get_child_by_id
+from db.async_repository import register_child, login_child_by_code, get_child_by_id
 from typing import Optional
 import uuid
 
@@ -19,14 +19,14 @@ class ChildLoginRequest(BaseModel):
     code: str
 
 @router.post("/child/register")
-def register(req: ChildRegisterRequest):
+async def register(req: ChildRegisterRequest):
     try:
         if req.first_time:
             # New child registration
             child_id = str(uuid.uuid4())
             code = str(uuid.uuid4())[:8].upper()  # 8-character code for easier sharing
             
-            register_child(child_id, req.name, req.age, req.gender, code, req.email)
+            await register_child(child_id, req.name, req.age, req.gender, code, req.email)
             
             return {
                 "child_id": child_id,
@@ -42,7 +42,7 @@ def register(req: ChildRegisterRequest):
             if not req.code:
                 raise Exception("Code is required for returning users.")
                 
-            child_data = login_child_by_code(req.code)
+            child_data = await login_child_by_code(req.code)
             if not child_data:
                 raise Exception("Invalid code. Please check and try again.")
                 
@@ -59,9 +59,9 @@ def register(req: ChildRegisterRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/child/login")
-def login(req: ChildLoginRequest):
+async def login(req: ChildLoginRequest):
     try:
-        child_data = login_child_by_code(req.code)
+        child_data = await login_child_by_code(req.code)
         if not child_data:
             raise Exception("Invalid code. Please verify the code and try again.")
             
@@ -77,10 +77,10 @@ def login(req: ChildLoginRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/child/{child_id}")
-def get_child_details(child_id: str):
+async def get_child_details(child_id: str):
     """Get child details by child_id"""
     try:
-        child_data = get_child_by_id(child_id)
+        child_data = await get_child_by_id(child_id)
         if not child_data:
             raise Exception("Child not found.")
             
@@ -96,10 +96,10 @@ def get_child_details(child_id: str):
         raise HTTPException(status_code=404, detail=str(e))
 
 @router.get("/child/code/{code}")
-def get_child_by_code(code: str):
+async def get_child_by_code(code: str):
     """Get child details by sharing code - useful for parent/teacher before starting test"""
     try:
-        child_data = login_child_by_code(code)
+        child_data = await login_child_by_code(code)
         if not child_data:
             raise Exception("Invalid code. Please verify the code and try again.")
             
@@ -1,11 +1,12 @@
 from fastapi import APIRouter, HTTPException
 from db.mongo_handler import get_test_by_id
+from db.accessors import TEST_HISTORY
 
 router=APIRouter()
 @router.get("/history/{test_id}")
 def get_chat_history(test_id:str):
     try:
-        test = get_test_by_id(test_id)
+        test = get_test_by_id(test_id, TEST_HISTORY)
         return {"chat_history": test.get("responses",[])}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,34 @@
+# backend_api/metrics.py - operational counters for sizing and tuning
+from fastapi import APIRouter
+from db.mongo_config import get_pool_stats
+from db.accessors import get_transfer_stats
+from db.child_cache import child_cache_stats
+from services.llm_dispatcher import get_llm_stats
+from services.speculation import speculation_stats
+
+router = APIRouter()
+
+@router.get("/metrics/mongo-pool")
+def mongo_pool_stats():
+    """Connection pool usage of the blocking and async Mongo clients (in use, peaks, checkout waits)"""
+    return get_pool_stats()
+
+@router.get("/metrics/mongo-transfer")
+def mongo_transfer_stats():
+    """Bytes read per field set (populated with MONGO_LOG_BYTES=1)"""
+    return get_transfer_stats()
+
+@router.get("/metrics/llm")
+def llm_stats():
+    """Per-backend latency percentiles, breaker state and hedging counters of the LLM dispatcher"""
+    return get_llm_stats()
+
+@router.get("/metrics/speculation")
+def speculation_counters():
+    """Next-turn preparations started, completed, cancelled (test moved on or submitted) and skipped"""
+    return speculation_stats()
+
+@router.get("/metrics/child-cache")
+def child_cache_counters():
+    """Hit/miss counters of the child record cache and how it is kept in sync across workers"""
+    return child_cache_stats()
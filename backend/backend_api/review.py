@@ -1,14 +1,13 @@
 # backend_api/review.py - PSYCHOLOGIST DASHBOARD ONLY
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Optional
 from pydantic import BaseModel
 from bson import ObjectId
 from db.mongo_handler import (
-    get_pending_reviews,
-    get_completed_reviews, 
     get_full_review,
-    submit_review,
     get_results_by_child_id
 )
+from db.async_repository import get_reviews_page, submit_review
 
 router = APIRouter()
 
@@ -29,24 +28,29 @@ def convert_objectid(data):
     else:
         return data
 
-# GET /review/pending - Psychologist sees pending reviews
-@router.get("/reviews/pending")
-def pending_reviews():
-    """Get all tests pending psychologist review"""
-    print("hello")
+async def reviews_page(status: str, response: Response, limit: Optional[int], after: Optional[str]):
+    """Body stays a plain list; the continuation cursor (if any) goes in the X-Next-Cursor header"""
     try:
-        return get_pending_reviews()
+        items, next_cursor = await get_reviews_page(status, limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+# GET /review/pending - Psychologist sees pending reviews
+@router.get("/reviews/pending")
+async def pending_reviews(response: Response, limit: Optional[int] = Query(None, ge=1), after: Optional[str] = None):
+    """Get tests pending psychologist review (all, or one page with ?limit=&after=)"""
+    return await reviews_page("pending", response, limit, after)
 
 # GET /review/completed  - Psychologist sees completed reviews
 @router.get("/reviews/completed")
-def completed_reviews():
-    """Get all completed psychologist reviews"""
-    try:
-        return get_completed_reviews()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def completed_reviews(response: Response, limit: Optional[int] = Query(None, ge=1), after: Optional[str] = None):
+    """Get completed psychologist reviews (all, or one page with ?limit=&after=)"""
+    return await reviews_page("reviewed", response, limit, after)
 
 # GET /review/{child_id} - Psychologist gets full details for review
 @router.get("/reviews/{child_id}")
@@ -60,10 +64,10 @@ def fetch_full_review(child_id: str):
 
 # POST /review/submit - Psychologist submits their review
 @router.post("/reviews/submit")
-def review_submit(req: SubmitReviewRequest):
+async def review_submit(req: SubmitReviewRequest):
     """Submit psychologist review and recommendations"""
     try:
-        submit_review(req.child_id, req.psychologist_review, req.reviewer_id)
+        await submit_review(req.child_id, req.psychologist_review, req.reviewer_id)
         return {"message": "Review submitted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
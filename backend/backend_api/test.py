@@ -1,13 +1,17 @@
 # backend_api/test.py
 
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from typing import Dict, List, Optional
-from db.mongo_handler import (
-    mark_test_submitted, check_all_submitted, generate_score, 
-    create_review_if_ready, get_child_tests_summary, get_test_results_for_user,
-    upsert_review_and_generate_summary,get_review_status_by_child_id
+from typing import Optional
+from db.mongo_handler import generate_score, get_test_results_for_user
+from db.async_repository import (
+    mark_test_submitted, get_child_tests_summary_page, get_test_by_id, get_review_status,
+    get_child_code as find_child_code, get_jobs_for_child
 )
+from db.accessors import TEST_CHILD, TEST_SCORE
+from services.submission_jobs import enqueue_submission
+from services.speculation import cancel_speculation
 
 router = APIRouter()
 
@@ -15,72 +19,73 @@ class SubmitTestRequest(BaseModel):
     test_id: str
 
 @router.post("/test/submit")
-def submit_test(req: SubmitTestRequest):
+async def submit_test(req: SubmitTestRequest):
     """
-    Handle test submission with integrated scoring and review creation
+    Mark the test submitted and queue scoring and review generation.
+    Returns as soon as the submission is stored; poll /test/status/{child_id} for progress.
     """
     try:
         print(f"Processing test submission for test_id: {req.test_id}")
         
-        # Step 1: Mark this test as submitted
-        updated = mark_test_submitted(req.test_id)
+        # Step 1: Mark this test as submitted (the durable state change)
+        test = await get_test_by_id(req.test_id, TEST_CHILD)
+        if not test:
+            raise Exception("Test not found or could not be updated.")
+        updated = await mark_test_submitted(req.test_id)
         if not updated:
             raise Exception("Test not found or could not be updated.")
         print(f"Test {req.test_id} marked as submitted")
+        cancel_speculation(req.test_id)
 
-        # Step 2: Generate and store score using your scoring logic
-        try:
-            score_data = generate_score(req.test_id)
-            print(f"Score generated: {score_data}")
-        except Exception as score_error:
-            print(f"Score generation failed: {score_error}")
-            # Continue even if scoring fails - can be retried later
-            pass
+        # Step 2: Scoring, then review + AI summary, run on the job queue. A retried submit
+        # gets the job of the first one back: the idempotency key makes this enqueue a no-op
+        job_key = await asyncio.to_thread(enqueue_submission, req.test_id, test["child_id"])
 
-        # Step 3: Check if all parties (child, parent, teacher) have submitted
-        # If so, create the review document
-        review_created = upsert_review_and_generate_summary(req.test_id)
-
-        
-        if review_created:
-            print(f"Review document created for test {req.test_id}")
-        else:
-            print(f"Review not created - waiting for other parties to submit")
-
-        # Return success response
-        response = {
+        return {
             "message": "Test submitted successfully.",
             "test_id": req.test_id,
-            "score_generated": True,
-            "review_created": review_created,
-            "next_step": "Review pending with psychologist" if review_created else "Waiting for other parties to complete their assessments"
+            "child_id": test["child_id"],
+            "job_id": job_key,
+            "score_generated": False,
+            "review_created": False,
+            "next_step": "Scoring and review summary in progress"
         }
-        
-        return response
 
     except Exception as e:
         print(f"Error in test submission: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/test/status/{child_id}")
-def get_child_status(child_id: str):
-    """Get the overall status of tests for a specific child"""
+async def get_child_status(child_id: str):
+    """Get the overall status of tests for a specific child, including queued scoring/summary jobs"""
     try:
-        from db.mongo_handler import get_review_status
-        status = get_review_status(child_id)
+        status, jobs = await asyncio.gather(get_review_status(child_id), get_jobs_for_child(child_id))
+        status["jobs"] = jobs
+        if status["status"] == "waiting" and any(j["status"] in ("queued", "running") for j in status["jobs"]):
+            status["status"] = "processing"
+            status["message"] = "Scoring and review summary in progress."
         return status
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/test/summary")
-def get_dashboard_summary(email: str = Query(...), role: str = Query(...)):
+async def get_dashboard_summary(
+    email: str = Query(...),
+    role: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None
+):
     """
     Get dashboard summary for parent/teacher showing their test history
     This replaces the /review/summary endpoint for non-psychologists
+    Pass limit (and the returned next_cursor as after) to page through many children
     """
     try:
-        # Get all tests taken by this user (parent/teacher) 
-        summary = get_child_tests_summary(email, role)
+        # Get all tests taken by this user (parent/teacher), grouped per child with review status
+        try:
+            summary, next_cursor = await get_child_tests_summary_page(email, role, limit, after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         if not summary:
             return {
@@ -103,8 +108,8 @@ def get_dashboard_summary(email: str = Query(...), role: str = Query(...)):
                     break
             
             if user_test:
-                # Check review status directly from reviews collection
-                review_status = get_review_status_by_child_id(child_data['child_id'])
+                # Review status comes joined in from the reviews collection
+                review_status = child_data.get('review_status')
                 
                 # Determine overall status based on all tests for this child
                 all_submitted = all(t.get('submitted', False) for t in child_tests)
@@ -137,9 +142,12 @@ def get_dashboard_summary(email: str = Query(...), role: str = Query(...)):
             
         return {
             "status": "has_tests",
-            "tests": tests
+            "tests": tests,
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in dashboard summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -162,11 +170,10 @@ def get_test_results(child_id: str, email: str = Query(...), role: str = Query(.
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/test/child-code/{child_id}")
-def get_child_code(child_id: str):
+async def get_child_code(child_id: str):
     """Get the sharing code for a child"""
     try:
-        from db.mongo_handler import get_child_code
-        code = get_child_code(child_id)
+        code = await find_child_code(child_id)
         if not code:
             raise HTTPException(status_code=404, detail="Child not found")
         return {"code": code}
@@ -174,11 +181,10 @@ def get_child_code(child_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/test/score/{test_id}")
-def get_test_score(test_id: str):
+async def get_test_score(test_id: str):
     """Get calculated score for a specific test"""
     try:
-        from db.mongo_handler import get_test_by_id
-        test = get_test_by_id(test_id)
+        test = await get_test_by_id(test_id, TEST_SCORE)
         
         if not test:
             raise HTTPException(status_code=404, detail="Test not found")
@@ -187,8 +193,7 @@ def get_test_score(test_id: str):
         if not scores:
             # Try to generate score if it doesn't exist
             try:
-                from db.mongo_handler import generate_score
-                scores = generate_score(test_id)
+                scores = await asyncio.to_thread(generate_score, test_id)
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Could not generate score: {str(e)}")
         
@@ -207,12 +212,13 @@ def get_best_score_by_child(child_id: str):
     Return highest available score from submitted tests for a child
     """
     from db.mongo_handler import tests_collection
+    from db.accessors import find_fields, TEST_BEST_SCORE
     try:
-        tests = list(tests_collection.find({
+        tests = find_fields(tests_collection, {
             "child_id": child_id,
             "submitted": True,
             "scores": {"$ne": None}
-        }))
+        }, TEST_BEST_SCORE)
         if not tests:
             raise HTTPException(status_code=404, detail="No submitted scored tests found for this child")
 
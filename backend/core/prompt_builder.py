@@ -1,10 +1,11 @@
 # core/prompt_builder.py
 
-from typing import List, Dict
+from types import MappingProxyType
+from typing import List, Dict, Optional, Sequence
 from utils.intent_classifier import detect_user_intent
 
-# --- Question banks omitted for brevity ---
-QUESTIONS_2_TO_4 = [
+# --- Question banks (immutable; rendering templates are compiled from them below) ---
+QUESTIONS_2_TO_4 = (
     "Considerate of other people's feelings",
     "Restless, overactive, cannot stay still for long",
     "Often complains of headaches, stomach-aches or sickness",
@@ -30,9 +31,9 @@ QUESTIONS_2_TO_4 = [
     "Gets along better with adults than with other children",
     "Many fears, easily scared",
     "Good attention span, sees work through to the end"
-]
+)
 
-QUESTIONS_4_TO_10 = [
+QUESTIONS_4_TO_10 = (
     "Considerate of other people's feelings",
     "Restless, overactive, cannot stay still for long",
     "Often complains of headaches, stomach-aches or sickness",
@@ -58,9 +59,9 @@ QUESTIONS_4_TO_10 = [
     "Gets along better with adults than with other children",
     "Many fears, easily scared",
     "Good attention span, sees work through to the end"
-]
+)
 
-QUESTIONS_11_TO_17 = [
+QUESTIONS_11_TO_17 = (
     "Considerate of other people's feelings",
     "Restless, overactive, cannot stay still for long",
     "Often complains of headaches, stomach-aches or sickness",
@@ -86,9 +87,9 @@ QUESTIONS_11_TO_17 = [
     "Gets along better with adults than with other youth",
     "Many fears, easily scared",
     "Good attention span, sees work through to the end"
-]
+)
 
-def get_questions_for_age(age: int) -> List[str]:
+def get_questions_for_age(age: int) -> Sequence[str]:
     if 2 <= age <= 4:
         return QUESTIONS_2_TO_4
     elif 5 <= age <= 10:
@@ -111,7 +112,8 @@ def convert_to_first_person(question: str) -> str:
         return "do you share " + question[7:].lower() + "?"
     return f"are you {question.lower()}?"
 
-def format_question(question: str, name: str, respondent_type: str) -> str:
+def _render_question(question: str, name: str, respondent_type: str) -> str:
+    """Reference wording; only used to compile the templates and for questions outside the banks"""
     if respondent_type == "child":
         return f"How often {convert_to_first_person(question)}"
     else:
@@ -127,10 +129,41 @@ def format_question(question: str, name: str, respondent_type: str) -> str:
             return f"Does {name} share {question[7:].lower()}?"
         return f"Is {name} {question.lower()}?"
 
-def build_question_prompt(question: str, name: str, respondent_type: str) -> str:
-    q = format_question(question, name, respondent_type)
+def _render_question_prompt(question: str, name: str, respondent_type: str) -> str:
+    q = _render_question(question, name, respondent_type)
     return f"{q}\nOptions: Not True / Somewhat True / Certainly True"
 
+# --- Precompiled rendering tables ---
+# Every (question, respondent form) pair is rendered once at import and split at the name
+# slot, so serving a question is a dict lookup plus one str.join.
+_NAME_SLOT = "\x00"
+_RESPONDENT_FORMS = ("child", "adult")
+
+def _compile_table(render) -> MappingProxyType:
+    return MappingProxyType({
+        form: MappingProxyType({
+            question: tuple(render(question, _NAME_SLOT, form).split(_NAME_SLOT))
+            for bank in (QUESTIONS_2_TO_4, QUESTIONS_4_TO_10, QUESTIONS_11_TO_17)
+            for question in bank
+        })
+        for form in _RESPONDENT_FORMS
+    })
+
+QUESTION_TEMPLATES = _compile_table(_render_question)
+QUESTION_PROMPT_TEMPLATES = _compile_table(_render_question_prompt)
+
+def format_question(question: str, name: str, respondent_type: str) -> str:
+    parts = QUESTION_TEMPLATES["child" if respondent_type == "child" else "adult"].get(question)
+    if parts is None:
+        return _render_question(question, name, respondent_type)
+    return str(name).join(parts)
+
+def build_question_prompt(question: str, name: str, respondent_type: str) -> str:
+    parts = QUESTION_PROMPT_TEMPLATES["child" if respondent_type == "child" else "adult"].get(question)
+    if parts is None:
+        return _render_question_prompt(question, name, respondent_type)
+    return str(name).join(parts)
+
 def build_system_instruction(child_name: str, age: int, respondent_type: str) -> str:
     if respondent_type == "child":
         role_line = f"You're a warm assistant helping {child_name}, a {age}-year-old child."
@@ -162,27 +195,70 @@ Examples:
 - "Right, they always do this – I'd say 'Certainly True'. Does that sound right?"
 """
 
+def format_chat_messages(chat_history: List[Dict[str, str]]) -> str:
+    return "\n".join([f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history])
+
+def build_analysis_prefix(age: int, question_index: int, child_name: str, respondent_type: str) -> str:
+    """
+    Start shared by every analysis prompt for a question (everything before the chat messages),
+    so a local server can keep it in its KV cache between turns
+    """
+    system_instruction = build_system_instruction(child_name, age, respondent_type)
+    question_text = format_question(get_questions_for_age(age)[question_index], child_name, respondent_type)
+    return f"""
+System: {system_instruction.strip()}
+
+Assistant: Let's look at the following question: "{question_text}"
+"""
+
 def build_analysis_prompt(
     age: int,
     question_index: int,
     chat_history: List[Dict[str, str]],
     child_name: str,
-    respondent_type: str
+    respondent_type: str,
+    formatted_messages: Optional[str] = None
 ) -> str:
-    system_instruction = build_system_instruction(child_name, age, respondent_type)
-    messages = "\n".join([f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history])
-    question_text = format_question(get_questions_for_age(age)[question_index], child_name, respondent_type)
+    messages = formatted_messages if formatted_messages is not None else format_chat_messages(chat_history)
 
-    return f"""
-System: {system_instruction.strip()}
-
-Assistant: Let's look at the following question: "{question_text}"
-{messages}
+    return build_analysis_prefix(age, question_index, child_name, respondent_type) + f"""{messages}
 
 Now based on the user's last response, what would you say?
 Give a brief explanation and end with: "Does that sound right?"
 """
 
+# Marks the combined intent + analysis prompt (also recognised by services/stub_llm_server.py)
+TURN_ANALYSIS_MARKER = "Reply with a single JSON object"
+
+def build_turn_analysis_prompt(
+    age: int,
+    question_index: int,
+    chat_history: List[Dict[str, str]],
+    child_name: str,
+    respondent_type: str,
+    formatted_messages: Optional[str] = None
+) -> str:
+    """Intent, suggested option and reply in one call; parsed by utils.intent_classifier.parse_turn_analysis"""
+    messages = formatted_messages if formatted_messages is not None else format_chat_messages(chat_history)
+
+    return build_analysis_prefix(age, question_index, child_name, respondent_type) + f"""{messages}
+
+First classify the user's latest message as one of:
+- direct_answer: a clear choice like "Not True", "Somewhat True" or "Certainly True"
+- confirmation: agrees with the assistant's suggestion
+- correction: pushes back, adds new information or disagrees (e.g. "but", "actually")
+- confused: asks for clarification or does not understand
+- asking_question: asks something about the question itself
+- sharing_experience: shares a real-life story, behavior or context
+- unclear: the intent is ambiguous
+
+Then, for correction, sharing_experience and unclear, suggest the option that fits best and write
+what you would say: a brief explanation ending with "Does that sound right?".
+
+{TURN_ANALYSIS_MARKER} and nothing else:
+{{"intent": "<label>", "suggested_option": "Not True" | "Somewhat True" | "Certainly True" | null, "reply": "<your reply, or empty>"}}
+"""
+
 def build_explanation_prompt(question: str, name: str, respondent_type: str) -> str:
     formatted = format_question(question, name, respondent_type)
     who = "child" if respondent_type == "child" else "parent or teacher"
@@ -192,6 +268,19 @@ def build_explanation_prompt(question: str, name: str, respondent_type: str) ->
         f"Use concrete, everyday examples. Avoid repeating the question directly."
     )
 
+# Stands in for the child's name in cached explanation prompts and replies
+CHILD_NAME_PLACEHOLDER = "CHILD_NAME"
+
+def build_explanation_template(question: str, respondent_type: str) -> str:
+    """Name-independent explanation prompt, so one cached reply serves every child"""
+    prompt = build_explanation_prompt(question, CHILD_NAME_PLACEHOLDER, respondent_type)
+    if respondent_type != "child":
+        prompt += f" Refer to the child only as {CHILD_NAME_PLACEHOLDER}."
+    return prompt
+
+def explanation_substitutions(name: str) -> Dict[str, str]:
+    return {CHILD_NAME_PLACEHOLDER: name or "the child"}
+
 def extract_option_from_llm_response(llm_response: str) -> str:
     response_lower = llm_response.lower()
     if "not true" in response_lower:
@@ -208,20 +297,47 @@ def extract_option_from_llm_response(llm_response: str) -> str:
         return "Somewhat True"
     return "Somewhat True"
 
+def _respondent_insight(test: Dict) -> str:
+    role = test["respondent_type"].capitalize()
+    score = test.get("scores", {}).get("total_score", "N/A")
+    responses = test.get("confirm_options", [])
+    answer_summary = ", ".join([f"{r['question']} -> {r['selected_option']}" for r in responses[:5]])  # Limit to first 5
+    return f"{role}'s interpretation:\n- SDQ Score: {score}\n- Sample answers: {answer_summary}"
+
+def build_respondent_summary_prompt(test: Dict, child_info: Dict) -> str:
+    """Partial summary of one respondent's test; combined per child by build_combined_summary_prompt"""
+    name = child_info.get("name", "the child")
+    age = child_info.get("age", "Unknown")
+    role = test["respondent_type"]
+    subscales = test.get("scores", {}).get("subscale_scores", {})
+    subscale_line = ", ".join(f"{k}: {v}" for k, v in subscales.items()) or "N/A"
+    return f"""You are a psychologist analyzing one SDQ questionnaire about {name}, a {age}-year-old child, answered by the {role}.
+
+{_respondent_insight(test)}
+- Subscale scores: {subscale_line}
+
+Summarize in 3-4 sentences what this {role}'s answers suggest about the child's behavior and emotional well-being.
+Keep it formal and factual."""
+
+def build_combined_summary_prompt(partial_summaries: Dict[str, str], child_info: Dict) -> str:
+    """Merge per-respondent partial summaries into the review summary"""
+    name = child_info.get("name", "the child")
+    age = child_info.get("age", "Unknown")
+    partials = "\n\n".join(f"{role.capitalize()}'s perspective:\n{text.strip()}" for role, text in partial_summaries.items())
+    return f"""You are a psychologist analyzing SDQ test results for {name}, a {age}-year-old child.
+
+{partials}
+
+Now generate a professional psychologist-style summary capturing insights, behavioral patterns, and emotional well-being.
+Compare the perspectives where they agree or differ. Keep it formal, insightful, and actionable."""
+
 def build_summary_prompt(all_tests: List[Dict], child_info: Dict) -> str:
     """Construct a prompt summarizing the child's behavioral test results from multiple perspectives."""
     name = child_info.get("name", "the child")
     age = child_info.get("age", "Unknown")
     intro = f"You are a psychologist analyzing SDQ test results for {name}, a {age}-year-old child."
     
-    respondent_insights = []
-    for test in all_tests:
-        role = test["respondent_type"].capitalize()
-        score = test.get("scores", {}).get("total_score", "N/A")
-        responses = test.get("confirm_options", [])
-        answer_summary = ", ".join([f"{r['question']} -> {r['selected_option']}" for r in responses[:5]])  # Limit to first 5
-        
-        respondent_insights.append(f"{role}'s interpretation:\n- SDQ Score: {score}\n- Sample answers: {answer_summary}")
+    respondent_insights = [_respondent_insight(test) for test in all_tests]
 
     joined = "\n\n".join(respondent_insights)
     
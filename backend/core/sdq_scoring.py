@@ -0,0 +1,89 @@
+# core/sdq_scoring.py
+#
+# Vectorized SDQ scoring. A test is encoded as a 25-element int8 answer vector
+# (0/1/2 per option, -1 when unanswered); item scores come from a precomputed reverse
+# mask and the subscales from a (5 x 25) membership matrix, so one call scores a single
+# test or a whole backfill/export batch.
+
+from datetime import datetime
+from typing import Dict, Iterable, List
+import numpy as np
+
+NUM_QUESTIONS = 25
+UNANSWERED = -1
+
+# Reverse scoring indices (0-based)
+REVERSE_INDICES = [6, 19, 13, 20, 24]
+
+# SDQ subscale definitions
+SUBSCALES = {
+    "emotional": [2, 7, 12, 15, 23],
+    "conduct": [4, 6, 11, 17, 21],
+    "hyperactivity": [1, 9, 14, 20, 24],
+    "peer": [5, 10, 13, 18, 23],
+    "prosocial": [0, 3, 8, 16, 19],
+}
+
+# Normal scoring; reversed items score 2 - code
+OPTION_CODES = {
+    "Not True": 0,
+    "Somewhat True": 1,
+    "Certainly True": 2,
+}
+
+MAX_POSSIBLE_SCORE = 2 * NUM_QUESTIONS
+
+_REVERSE_MASK = np.zeros(NUM_QUESTIONS, dtype=bool)
+_REVERSE_MASK[REVERSE_INDICES] = True
+
+_SUBSCALE_MATRIX = np.zeros((len(SUBSCALES), NUM_QUESTIONS), dtype=np.int32)
+for _row, _indices in enumerate(SUBSCALES.values()):
+    _SUBSCALE_MATRIX[_row, _indices] = 1
+
+
+def encode_answers(confirm_options: List[Dict]) -> np.ndarray:
+    """Answer vector of a test; a question answered more than once keeps its latest answer"""
+    answers = np.full(NUM_QUESTIONS, UNANSWERED, dtype=np.int8)
+    for response in confirm_options:
+        index = response.get("question_index")
+        if isinstance(index, int) and 0 <= index < NUM_QUESTIONS:
+            answers[index] = OPTION_CODES.get(response.get("selected_option"), UNANSWERED)
+    return answers
+
+
+def item_scores(answers: np.ndarray) -> np.ndarray:
+    """Per-question points for an (n, 25) answer matrix; unanswered or unknown options score 0"""
+    answers = answers.astype(np.int32)
+    scored = np.where(_REVERSE_MASK, 2 - answers, answers)
+    return np.where(answers == UNANSWERED, 0, scored)
+
+
+def score_matrix(answers: np.ndarray):
+    """Totals (n,) and subscale scores (n, 5) for an (n, 25) answer matrix"""
+    items = item_scores(np.atleast_2d(answers))
+    return items.sum(axis=1), items @ _SUBSCALE_MATRIX.T
+
+
+def score_tests(tests: Iterable[Dict]) -> List[Dict]:
+    """
+    Score many tests (dicts with test_id and confirm_options) in one pass.
+    Returns one score dict per test, in order, shaped like tests.scores.
+    """
+    tests = list(tests)
+    if not tests:
+        return []
+    answers = np.stack([encode_answers(t.get("confirm_options", [])) for t in tests])
+    totals, subscales = score_matrix(answers)
+    calculated_at = datetime.utcnow().isoformat()
+    names = list(SUBSCALES)
+    return [
+        {
+            "test_id": test.get("test_id"),
+            "total_score": int(total),
+            "response_count": len(test.get("confirm_options", [])),
+            "subscale_scores": dict(zip(names, row.tolist())),
+            "max_possible_score": MAX_POSSIBLE_SCORE,
+            "calculated_at": calculated_at
+        }
+        for test, total, row in zip(tests, totals, subscales)
+    ]
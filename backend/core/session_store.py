@@ -0,0 +1,93 @@
+# core/session_store.py
+#
+# Server-side conversation state for /chat/respond, keyed by test_id.
+# Messages are persisted in the chat_sessions collection and cached in a per-process LRU.
+# Every append is a single find_one_and_update that bumps a version counter; when the
+# returned version is exactly one past the cached one, the cache is still current and is
+# extended locally, otherwise (another worker wrote in between) it is reloaded from Mongo.
+# The version never goes back (not even when a legacy client replaces the history), so the
+# version returned for a write also keys that message's stored embedding.
+
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import ReturnDocument
+from utils.lru_cache import LRUCache
+from db.mongo_handler import chat_sessions_collection
+
+CHAT_SESSION_CACHE_SIZE = int(os.getenv("CHAT_SESSION_CACHE_SIZE", "2000"))
+# How many messages of the current question the prompts see
+CHAT_WINDOW_MESSAGES = int(os.getenv("CHAT_WINDOW_MESSAGES", "8"))
+
+_sessions = LRUCache(maxsize=CHAT_SESSION_CACHE_SIZE)
+
+
+def _load(test_id: str) -> dict:
+    doc = chat_sessions_collection.find_one({"test_id": test_id}, {"_id": 0, "messages": 1, "version": 1})
+    session = {"messages": list(doc.get("messages", [])), "version": doc.get("version", 0)} if doc else {"messages": [], "version": 0}
+    _sessions.set(test_id, session)
+    return session
+
+
+def get_messages(test_id: str) -> List[Dict]:
+    session = _sessions.get(test_id)
+    if session is None:
+        session = _load(test_id)
+    return list(session["messages"])
+
+
+def append_messages(test_id: str, messages: List[Dict]) -> Tuple[List[Dict], int]:
+    """Persist new messages; returns the full, up-to-date conversation and the version of this write"""
+    doc = chat_sessions_collection.find_one_and_update(
+        {"test_id": test_id},
+        {
+            "$push": {"messages": {"$each": messages}},
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": {"created_at": datetime.utcnow()}
+        },
+        projection={"_id": 0, "version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    cached = _sessions.get(test_id)
+    if cached is not None and doc["version"] == cached["version"] + 1:
+        session = {"messages": cached["messages"] + messages, "version": doc["version"]}
+        _sessions.set(test_id, session)
+    else:
+        session = _load(test_id)
+    return list(session["messages"]), doc["version"]
+
+
+def replace_messages(test_id: str, messages: List[Dict]) -> Tuple[List[Dict], int]:
+    """Legacy clients resend the whole history; it becomes the stored conversation (returned with its version)"""
+    doc = chat_sessions_collection.find_one_and_update(
+        {"test_id": test_id},
+        {
+            "$set": {"messages": messages, "updated_at": datetime.utcnow()},
+            "$inc": {"version": 1},
+            "$setOnInsert": {"created_at": datetime.utcnow()}
+        },
+        projection={"_id": 0, "version": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    _sessions.set(test_id, {"messages": list(messages), "version": doc["version"]})
+    return list(messages), doc["version"]
+
+
+def drop_session(test_id: str):
+    _sessions.pop(test_id)
+
+
+def question_window(messages: List[Dict], question_index: Optional[int], limit: int = CHAT_WINDOW_MESSAGES) -> List[Dict[str, str]]:
+    """The last `limit` messages exchanged about the current question, as plain role/content dicts"""
+    if question_index is not None:
+        current = [m for m in messages if m.get("question_index", question_index) == question_index]
+    else:
+        current = messages
+    return [{"role": m["role"], "content": m["content"]} for m in current[-limit:]]
+
+
+def session_stats() -> dict:
+    return _sessions.stats()
@@ -0,0 +1,64 @@
+# core/turn_context.py
+
+from functools import cached_property
+from typing import List, Dict, Optional
+from core.prompt_builder import extract_option_from_llm_response, format_chat_messages
+from utils.intent_classifier import normalize_message
+
+
+class TurnContext:
+    """
+    Per-request view of the latest user turn.
+
+    Everything derived from the user's message (embedding, normalized text, extracted
+    option, formatted history) is computed at most once and shared by the intent
+    classifier, vector storage and the prompt builders.
+    """
+
+    def __init__(self, test_id: str, question_index: int, chat_history: List[Dict[str, str]], turn_index: Optional[int] = None):
+        self.test_id = test_id
+        self.question_index = question_index
+        # Bounded window of the conversation the prompts should see
+        self.chat_history = chat_history or []
+        self._turn_index = turn_index
+
+    @property
+    def turn_index(self) -> int:
+        """Key of the latest message's stored embedding: the chat session version that recorded it"""
+        if self._turn_index is not None:
+            return self._turn_index
+        return max(0, len(self.chat_history) - 1)
+
+    @cached_property
+    def text(self) -> str:
+        return self.chat_history[-1]["content"].strip() if self.chat_history else ""
+
+    @cached_property
+    def normalized_text(self) -> str:
+        return normalize_message(self.text)
+
+    @cached_property
+    def embedding(self) -> list:
+        from db.vector_store import embed_text  # local import: loads the embedding model
+        return embed_text(self.text)
+
+    @cached_property
+    def extracted_option(self) -> str:
+        return extract_option_from_llm_response(self.text)
+
+    @cached_property
+    def formatted_history(self) -> str:
+        return format_chat_messages(self.chat_history)
+
+    @cached_property
+    def recent_history(self) -> str:
+        """Last four messages, as used by the intent prompt"""
+        return format_chat_messages(self.chat_history[-4:])
+
+    def has_embedding(self) -> bool:
+        return "embedding" in self.__dict__
+
+
+def build_turn_context(test_id: str, question_index: Optional[int], chat_history: List[Dict[str, str]],
+                       turn_index: Optional[int] = None) -> TurnContext:
+    return TurnContext(test_id, question_index, chat_history, turn_index)
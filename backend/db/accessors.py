@@ -0,0 +1,129 @@
+# db/accessors.py
+#
+# Projection-aware reads. Every call site passes a named Fields set, so Mongo only sends
+# the fields that caller uses (e.g. the /chat/respond "submitted" check never transfers
+# chat history or embeddings). With MONGO_LOG_BYTES=1 each read also records the BSON
+# bytes it transferred, grouped by field-set name.
+
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+import bson
+from db.indexes import MONGO_AUDIT_PLANS, audit_query
+
+MONGO_LOG_BYTES = os.getenv("MONGO_LOG_BYTES", "0") == "1"
+
+
+class Fields:
+    """A named projection. Inclusion by default; use Fields.excluding for 'everything but'."""
+
+    def __init__(self, name: str, *fields: str, exclude: bool = False):
+        self.name = name
+        self.fields = fields
+        self.projection = {f: 0 if exclude else 1 for f in fields}
+
+    @classmethod
+    def excluding(cls, name: str, *fields: str) -> "Fields":
+        return cls(name, *fields, exclude=True)
+
+    def __repr__(self):
+        return f"Fields({self.name}: {', '.join(self.fields)})"
+
+
+# ---------------------------- FIELD SETS ----------------------------
+USER_AUTH = Fields("user_auth", "email", "password_hash", "role")
+
+CHILD_PROFILE = Fields("child_profile", "child_id", "name", "age", "gender", "code", "email", "registered_on")
+CHILD_NAME = Fields("child_name", "child_id", "name")
+CHILD_CODE = Fields("child_code", "child_id", "code")
+
+TEST_STATUS = Fields("test_status", "test_id", "submitted")
+TEST_CONFIRM = Fields("test_confirm", "test_id", "submitted", "child_name")
+TEST_ID = Fields("test_id", "test_id")
+TEST_CHILD = Fields("test_child", "test_id", "child_id")
+TEST_LISTING = Fields("test_listing", "test_id", "child_id", "respondent_type", "email", "submitted", "created_at")
+TEST_SCORE = Fields("test_score", "test_id", "scores", "submitted", "created_at")
+TEST_SCORING = Fields("test_scoring", "test_id", "confirm_options")
+TEST_RESCORE = Fields("test_rescore", "test_id", "child_id", "respondent_type", "confirm_options", "scores")
+TEST_SUMMARY_SCORES = Fields("test_summary_scores", "child_id", "respondent_type", "scores")
+TEST_SUMMARY = Fields("test_summary", "test_id", "child_id", "respondent_type", "scores", "confirm_options")
+TEST_BEST_SCORE = Fields("test_best_score", "test_id", "scores.total_score")
+TEST_HISTORY = Fields("test_history", "test_id", "responses")
+TEST_DETAIL = Fields.excluding("test_detail", "vector_responses")
+
+REVIEW_STATUS = Fields("review_status", "child_id", "status")
+REVIEW_SUMMARY_STATE = Fields(
+    "review_summary_state", "child_id", "status", "ai_generated_summary", "psychologist_review",
+    "partial_summaries", "summary_inputs"
+)
+REVIEW_RESULT = Fields(
+    "review_result", "child_id", "status", "psychologist_review", "reviewed_by",
+    "reviewed_at", "submitted_at", "scores"
+)
+
+
+# ---------------------------- TRANSFER ACCOUNTING ----------------------------
+_stats_lock = threading.Lock()
+_transfer_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _record(fields: Fields, docs: Iterable[dict]):
+    size = sum(len(bson.encode(d)) for d in docs if d)
+    with _stats_lock:
+        entry = _transfer_stats.setdefault(fields.name, {"calls": 0, "docs": 0, "bytes": 0})
+        entry["calls"] += 1
+        entry["docs"] += len(docs)
+        entry["bytes"] += size
+    print(f"[Mongo] {fields.name}: {len(docs)} doc(s), {size} bytes")
+
+
+def get_transfer_stats() -> Dict[str, Dict[str, int]]:
+    """Bytes transferred per field set since process start (only populated with MONGO_LOG_BYTES=1)"""
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _transfer_stats.items()}
+
+
+# ---------------------------- READS ----------------------------
+def find_one_fields(collection, query: dict, fields: Fields, sort: Optional[list] = None) -> Optional[dict]:
+    if MONGO_AUDIT_PLANS:
+        audit_query(collection, query, sort)
+    doc = collection.find_one(query, fields.projection, sort=sort)
+    if MONGO_LOG_BYTES:
+        _record(fields, [doc] if doc else [])
+    return doc
+
+
+def find_fields(collection, query: dict, fields: Fields, sort: Optional[list] = None, limit: int = 0) -> List[dict]:
+    if MONGO_AUDIT_PLANS:
+        audit_query(collection, query, sort)
+    cursor = collection.find(query, fields.projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    docs = list(cursor)
+    if MONGO_LOG_BYTES:
+        _record(fields, docs)
+    return docs
+
+
+# ---------------------------- ASYNC READS ----------------------------
+# Same contract for the asyncio collections of db/async_repository.py. Query shapes are
+# audited by the blocking variants (scripts/audit_query_plans.py covers both paths).
+async def find_one_fields_async(collection, query: dict, fields: Fields, sort: Optional[list] = None) -> Optional[dict]:
+    doc = await collection.find_one(query, fields.projection, sort=sort)
+    if MONGO_LOG_BYTES:
+        _record(fields, [doc] if doc else [])
+    return doc
+
+
+async def find_fields_async(collection, query: dict, fields: Fields, sort: Optional[list] = None, limit: int = 0) -> List[dict]:
+    cursor = collection.find(query, fields.projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    docs = await cursor.to_list(None)
+    if MONGO_LOG_BYTES:
+        _record(fields, docs)
+    return docs
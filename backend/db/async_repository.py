@@ -0,0 +1,194 @@
+# db/async_repository.py
+#
+# Non-blocking counterparts of the db/mongo_handler functions that request handlers call,
+# on PyMongo's asyncio client (AsyncMongoClient, pymongo>=4.13). Handlers await these, so a
+# request waiting on Mongo no longer holds a threadpool thread or blocks the event loop.
+# The blocking module stays for scripts, the job queue and the heavier review assembly.
+# Connection settings come from db/mongo_config.py.
+
+import uuid
+from datetime import datetime
+from db import child_cache
+from db.mongo_config import MONGO_DB, create_client, dashboard_read_preference
+from db.accessors import (
+    Fields, find_one_fields_async,
+    USER_AUTH, CHILD_PROFILE, CHILD_CODE, TEST_STATUS, TEST_ID, TEST_DETAIL, REVIEW_RESULT
+)
+from db.pipelines import child_tests_summary_pipeline, review_listing_pipeline, page_size, split_page
+
+_client = None
+
+
+def get_async_db():
+    """The client is created on first use, inside the running event loop"""
+    global _client
+    if _client is None:
+        _client = create_client(async_client=True)
+    return _client[MONGO_DB]
+
+
+async def close_async_mongo():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _collection(name: str):
+    return get_async_db()[name]
+
+
+def _dashboard_collection(name: str):
+    """Listings tolerate slightly stale data, so they may be served by secondaries"""
+    return get_async_db()[name].with_options(read_preference=dashboard_read_preference())
+
+
+# ---------------------------- AUTHENTICATION ----------------------------
+async def create_user(email, password_hash, role):
+    await _collection("users").insert_one({
+        "email": email,
+        "password_hash": password_hash,
+        "role": role,
+        "created_at": datetime.utcnow()
+    })
+
+async def get_user_by_email(email, fields: Fields = USER_AUTH):
+    return await find_one_fields_async(_collection("users"), {"email": email}, fields)
+
+# ---------------------------- CHILDREN ----------------------------
+async def register_child(child_id, name, age, gender, code, email):
+    await _collection("children").insert_one({
+        "child_id": child_id,
+        "name": name,
+        "age": age,
+        "gender": gender,
+        "code": code,
+        "email": email,
+        "registered_on": datetime.utcnow()
+    })
+    child_cache.invalidate(child_id, code)
+
+async def _cached_child(key_field, value, fields: Fields):
+    """Read-through db/child_cache.py lookup by child_id or code"""
+    if not child_cache.cacheable(fields):
+        return await find_one_fields_async(_collection("children"), {key_field: value}, fields)
+    child = child_cache.lookup(key_field, value, fields)
+    if child is None:
+        doc = await find_one_fields_async(_collection("children"), {key_field: value}, CHILD_PROFILE)
+        child = child_cache.remember(doc, fields)
+    return child
+
+async def login_child_by_code(code, fields: Fields = CHILD_PROFILE):
+    return await _cached_child("code", code, fields)
+
+async def login_child_by_email(email, fields: Fields = CHILD_PROFILE):
+    return await find_one_fields_async(_collection("children"), {"email": email}, fields)
+
+async def get_child_by_id(child_id, fields: Fields = CHILD_PROFILE):
+    return await _cached_child("child_id", child_id, fields)
+
+async def get_child_code(child_id):
+    child = await _cached_child("child_id", child_id, CHILD_CODE)
+    return child.get("code") if child else None
+
+# ---------------------------- TESTS ----------------------------
+async def get_child_tests_summary_page(email, role, limit=None, after=None):
+    limit = page_size(limit)
+    cursor = await _dashboard_collection("tests").aggregate(child_tests_summary_pipeline(email, role, after, limit))
+    docs, next_cursor = split_page(await cursor.to_list(None), limit, cursor_field="first_test")
+    for doc in docs:
+        doc.pop("first_test", None)
+    return docs, next_cursor
+
+async def get_test_by_id(test_id, fields: Fields = TEST_DETAIL):
+    test = await find_one_fields_async(_collection("tests"), {"test_id": test_id}, fields)
+    if not test:
+        raise Exception(f"Test with id {test_id} not found")
+    return test
+
+async def get_test_status(test_id):
+    return await get_test_by_id(test_id, TEST_STATUS)
+
+async def create_or_resume_test(child_id, age, child_name, respondent_type, email):
+    existing_test = await find_one_fields_async(_collection("tests"), {
+        "child_id": child_id,
+        "respondent_type": respondent_type,
+        "email": email,
+        "submitted": False
+    }, TEST_ID)
+    if existing_test:
+        print(f"Found existing incomplete test: {existing_test['test_id']}")
+        return {"test_id": existing_test["test_id"], "is_new": False, "message": "Resuming your previous test..."}
+
+    test_id = str(uuid.uuid4())
+    print("Creating new test_id:", test_id)
+    await _collection("tests").insert_one({
+        "test_id": test_id,
+        "age": age,
+        "child_name": child_name,
+        "child_id": child_id,
+        "respondent_type": respondent_type,
+        "email": email,
+        "submitted": False,
+        "confirm_options": [],
+        "scores": None,
+        "created_at": datetime.utcnow()
+    })
+    return {"test_id": test_id, "is_new": True, "message": "Starting new test..."}
+
+async def store_response(test_id, question_index, question, selected_option):
+    if "'" in selected_option:
+        selected_option = selected_option.split("'")[1]
+    await _collection("tests").update_one(
+        {"test_id": test_id},
+        {"$push": {"confirm_options": {
+            "question_index": question_index,
+            "question": question,
+            "selected_option": selected_option
+        }}}
+    )
+
+async def mark_test_submitted(test_id):
+    # matched, not modified: resubmitting an already submitted test is not an error
+    result = await _collection("tests").update_one({"test_id": test_id}, {"$set": {"submitted": True}})
+    return result.matched_count > 0
+
+# ---------------------------- REVIEWS ----------------------------
+async def get_review_status(child_id):
+    review = await find_one_fields_async(_collection("reviews"), {"child_id": child_id}, REVIEW_RESULT)
+    if not review:
+        return {"status": "waiting", "message": "Review not generated yet."}
+    return {
+        "status": review["status"],
+        "summary": review["psychologist_review"] if review["status"] == "reviewed" else None
+    }
+
+async def get_reviews_page(status, limit=None, after=None):
+    limit = page_size(limit)
+    cursor = await _dashboard_collection("reviews").aggregate(review_listing_pipeline(status, after, limit))
+    docs, next_cursor = split_page(await cursor.to_list(None), limit)
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs, next_cursor
+
+async def submit_review(child_id, psychologist_review, reviewer_id):
+    result = await _collection("reviews").update_one(
+        {"child_id": child_id},
+        {"$set": {
+            "status": "reviewed",
+            "psychologist_review": psychologist_review,
+            "reviewed_by": reviewer_id,
+            "reviewed_at": datetime.utcnow()
+        }}
+    )
+    if result.modified_count == 0:
+        raise Exception("Review not found or could not be updated")
+    print(f"Review submitted for child {child_id} by {reviewer_id}")
+
+# ---------------------------- JOBS ----------------------------
+async def get_jobs_for_child(child_id):
+    cursor = _collection("jobs").find(
+        {"child_id": child_id},
+        {"_id": 0, "key": 1, "type": 1, "status": 1, "attempts": 1, "last_error": 1, "updated_at": 1}
+    ).sort("created_at", 1)
+    return await cursor.to_list(None)
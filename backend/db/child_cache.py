@@ -0,0 +1,196 @@
+# db/child_cache.py
+#
+# Read-through cache of child records, keyed by child_id and by sharing code. A child's
+# name, age and code practically never change, yet /chat/start, /child/*, the dashboard and
+# review assembly all look them up. Entries hold the CHILD_PROFILE fields and are served to
+# any caller asking for a subset of them (CHILD_NAME, CHILD_CODE, ...).
+#
+# Coherence across workers:
+#   register_child  invalidates locally
+#   change stream   a background thread watches the children collection and drops entries
+#                   that changed anywhere (needs a replica set / Atlas)
+#   polling         without change streams, cached entries are re-read in batches every
+#                   CHILD_CACHE_POLL_INTERVAL seconds and dropped when they differ
+#   TTL             CHILD_CACHE_TTL bounds staleness whatever the sync mode
+# CHILD_CACHE_SYNC picks the mode: auto (change stream, falling back to polling), change_stream,
+# poll or off.
+
+import os
+import threading
+from typing import Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from utils.lru_cache import LRUCache
+from db.accessors import Fields, CHILD_PROFILE
+
+CHILD_CACHE_ENABLED = os.getenv("CHILD_CACHE_ENABLED", "1") == "1"
+CHILD_CACHE_SIZE = int(os.getenv("CHILD_CACHE_SIZE", "10000"))
+CHILD_CACHE_TTL = float(os.getenv("CHILD_CACHE_TTL", "600"))
+CHILD_CACHE_SYNC = os.getenv("CHILD_CACHE_SYNC", "auto").lower()
+CHILD_CACHE_POLL_INTERVAL = float(os.getenv("CHILD_CACHE_POLL_INTERVAL", "30"))
+CHILD_CACHE_POLL_BATCH = int(os.getenv("CHILD_CACHE_POLL_BATCH", "500"))
+
+KEY_FIELDS = ("child_id", "code")
+
+_children = LRUCache(maxsize=CHILD_CACHE_SIZE, ttl=CHILD_CACHE_TTL)
+_sync_stats = {"mode": None, "invalidations": 0, "polls": 0, "sync_errors": 0}
+
+
+def cacheable(fields: Fields) -> bool:
+    """Only inclusion projections within CHILD_PROFILE can be answered from a cached profile"""
+    return CHILD_CACHE_ENABLED and all(v == 1 for v in fields.projection.values()) \
+        and set(fields.fields) <= set(CHILD_PROFILE.fields)
+
+
+def _project(doc: dict, fields: Fields) -> dict:
+    projected = {"_id": doc["_id"]} if "_id" in doc else {}
+    projected.update((f, doc[f]) for f in fields.fields if f in doc)
+    return projected
+
+
+def lookup(key_field: str, value, fields: Fields) -> Optional[dict]:
+    """Cached record with only `fields` (plus _id, as a Mongo projection returns), or None on a miss"""
+    doc = _children.get((key_field, value))
+    return None if doc is None else _project(doc, fields)
+
+
+def remember(doc: Optional[dict], fields: Fields) -> Optional[dict]:
+    """Cache a CHILD_PROFILE document under both keys; returns it projected to `fields`"""
+    if doc is None:
+        return None
+    for key_field in KEY_FIELDS:
+        if doc.get(key_field) is not None:
+            _children.set((key_field, doc[key_field]), doc)
+    return _project(doc, fields)
+
+
+def invalidate(child_id: Optional[str] = None, code: Optional[str] = None):
+    """Drop a child's entries; the code of a cached child_id is dropped too (it may have changed)"""
+    cached = _children.pop(("child_id", child_id)) if child_id is not None else None
+    codes = {code, cached.get("code") if cached else None} - {None}
+    for c in codes:
+        other = _children.pop(("code", c))
+        if other and other.get("child_id") not in (None, child_id):
+            _children.pop(("child_id", other["child_id"]))
+    _sync_stats["invalidations"] += 1
+
+
+def clear():
+    _children.clear()
+
+
+def child_cache_stats() -> dict:
+    return {**_children.stats(), **_sync_stats, "ttl": CHILD_CACHE_TTL, "enabled": CHILD_CACHE_ENABLED}
+
+
+# ---------------------------- CROSS-WORKER SYNC ----------------------------
+def _collection():
+    # Imported lazily: db.mongo_handler imports this module
+    from db.mongo_handler import children_collection
+    return children_collection
+
+
+class ChildCacheSync:
+    """Background thread keeping the cache coherent with writes made by other workers"""
+
+    def __init__(self, mode: str = CHILD_CACHE_SYNC):
+        self.mode = mode
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.mode == "off" or not CHILD_CACHE_ENABLED:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="child-cache-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def _run(self):
+        if self.mode in ("auto", "change_stream"):
+            try:
+                _sync_stats["mode"] = "change_stream"
+                self._watch()
+                return
+            except OperationFailure as e:
+                # Standalone servers have no change streams
+                if self.mode == "change_stream":
+                    _sync_stats["mode"] = None
+                    print(f"[ChildCache] Change stream unavailable, sync disabled: {e}")
+                    return
+                print(f"[ChildCache] Change stream unavailable, polling every {CHILD_CACHE_POLL_INTERVAL}s: {e}")
+        _sync_stats["mode"] = "poll"
+        self._poll()
+
+    def _watch(self):
+        resume_token = None
+        while not self._stop.is_set():
+            try:
+                with _collection().watch(full_document="updateLookup", resume_after=resume_token,
+                                        max_await_time_ms=1000) as stream:
+                    # Anything cached before the stream opened may already be stale
+                    if resume_token is None:
+                        clear()
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = stream.resume_token
+                        self._apply(change)
+            except OperationFailure:
+                if resume_token is None:
+                    raise
+                # Resume token no longer in the oplog: start over from a clean cache
+                resume_token = None
+                _sync_stats["sync_errors"] += 1
+            except PyMongoError as e:
+                _sync_stats["sync_errors"] += 1
+                print(f"[ChildCache] Change stream error, reconnecting: {e}")
+                self._stop.wait(CHILD_CACHE_POLL_INTERVAL)
+
+    def _apply(self, change: dict):
+        operation = change.get("operationType")
+        if operation in ("insert", "replace", "update"):
+            doc = change.get("fullDocument") or {}
+            child_id = doc.get("child_id")
+            if child_id is None:
+                # No fullDocument when the child was deleted before the lookup; start over
+                clear()
+            else:
+                invalidate(child_id, doc.get("code"))
+        else:
+            # delete / drop / rename / invalidate: only the _id is known
+            clear()
+
+    def _poll(self):
+        while not self._stop.wait(CHILD_CACHE_POLL_INTERVAL):
+            try:
+                self.revalidate()
+            except PyMongoError as e:
+                _sync_stats["sync_errors"] += 1
+                print(f"[ChildCache] Poll failed: {e}")
+
+    def revalidate(self):
+        """Re-read every cached child and drop the ones that changed or disappeared"""
+        _sync_stats["polls"] += 1
+        cached = {doc["child_id"]: doc for _, doc in _children.items() if doc.get("child_id") is not None}
+        child_ids = list(cached)
+        for start in range(0, len(child_ids), CHILD_CACHE_POLL_BATCH):
+            batch = child_ids[start:start + CHILD_CACHE_POLL_BATCH]
+            current = {d["child_id"]: d for d in _collection().find({"child_id": {"$in": batch}}, CHILD_PROFILE.projection)}
+            for child_id in batch:
+                if current.get(child_id) != cached[child_id]:
+                    invalidate(child_id, cached[child_id].get("code"))
+
+
+child_cache_sync = ChildCacheSync()
+
+def start_child_cache_sync():
+    child_cache_sync.start()
+
+def stop_child_cache_sync():
+    child_cache_sync.stop()
@@ -0,0 +1,99 @@
+# db/embedding_backends.py
+#
+# Interchangeable encoders behind db/vector_store.embed_text, selected with EMBEDDING_BACKEND:
+#   sentence-transformers (default) - the original torch model
+#   onnx                            - same weights exported to ONNX, run with onnxruntime (no torch)
+#   onnx-int8                       - dynamically int8-quantized ONNX export (smallest, fastest on CPU)
+
+import os
+import threading
+import numpy as np
+from typing import List
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_HF_REPO = os.getenv("EMBEDDING_HF_REPO", f"sentence-transformers/{EMBEDDING_MODEL}")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", "256"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+
+class SentenceTransformerBackend:
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=EMBED_BATCH_SIZE)
+
+
+class OnnxBackend:
+    """
+    MiniLM forward pass in onnxruntime with the same mean pooling and L2 normalization
+    as the sentence-transformers pipeline. Model files come from the Hugging Face hub cache.
+    """
+    name = "onnx"
+
+    def __init__(self, onnx_file: str = EMBEDDING_ONNX_FILE, repo_id: str = EMBEDDING_HF_REPO):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(hf_hub_download(repo_id, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=EMBEDDING_MAX_TOKENS)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            hf_hub_download(repo_id, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        batches = [self._encode_batch(texts[i:i + EMBED_BATCH_SIZE]) for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+        return np.vstack(batches) if batches else np.zeros((0, 384), dtype=np.float32)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    name = "onnx-int8"
+
+    def __init__(self, onnx_file: str = EMBEDDING_ONNX_INT8_FILE, repo_id: str = EMBEDDING_HF_REPO):
+        super().__init__(onnx_file, repo_id)
+
+
+EMBEDDING_BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxBackend.name: OnnxBackend,
+    QuantizedOnnxBackend.name: QuantizedOnnxBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_embedding_backend(name: str = None):
+    """Return the (lazily constructed, process-wide) backend for name or EMBEDDING_BACKEND"""
+    name = name or EMBEDDING_BACKEND
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unsupported EMBEDDING_BACKEND: {name}")
+    if name not in _backends:
+        with _backends_lock:
+            if name not in _backends:
+                _backends[name] = EMBEDDING_BACKENDS[name]()
+    return _backends[name]
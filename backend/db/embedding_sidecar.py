@@ -0,0 +1,36 @@
+# db/embedding_sidecar.py
+#
+# Standalone embedding service so several API workers share one copy of the model weights.
+# Run it next to the API and point the workers at it:
+#
+#   uvicorn db.embedding_sidecar:app --host 127.0.0.1 --port 8100
+#   EMBEDDING_SIDECAR_URL=http://127.0.0.1:8100 uvicorn main:app --workers 4
+
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from db.embedding_backends import get_embedding_backend, EMBEDDING_BACKEND, EMBEDDING_MODEL
+
+backend = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global backend
+    backend = get_embedding_backend()
+    backend.encode(["warm up"])
+    yield
+
+app = FastAPI(lifespan=lifespan)
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "model": EMBEDDING_MODEL, "backend": EMBEDDING_BACKEND, "loaded": backend is not None}
+
+@app.post("/embed")
+def embed(req: EmbedRequest):
+    return {"embeddings": backend.encode(req.texts).tolist()}
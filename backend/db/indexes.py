@@ -0,0 +1,152 @@
+# db/indexes.py
+#
+# Declares the indexes every hot query relies on, creates them idempotently at startup
+# and reports drift between the declaration and what the server actually has.
+# Also holds the explain() helpers used by the dev-mode query-plan audit.
+
+import os
+import threading
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "1") == "1"
+# Dev mode: explain() each distinct query shape the accessors run and warn on collection scans
+MONGO_AUDIT_PLANS = os.getenv("MONGO_AUDIT_PLANS", "0") == "1"
+# Persistent LLM response cache entries expire after this many days
+LLM_CACHE_TTL_DAYS = int(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "tests": [
+        IndexModel([("test_id", ASCENDING)], name="test_id_unique", unique=True),
+        IndexModel([("child_id", ASCENDING), ("respondent_type", ASCENDING), ("email", ASCENDING), ("submitted", ASCENDING)],
+                   name="child_respondent_email_submitted"),
+        IndexModel([("child_id", ASCENDING), ("submitted", ASCENDING)], name="child_submitted"),
+        IndexModel([("email", ASCENDING), ("respondent_type", ASCENDING), ("_id", ASCENDING)], name="email_respondent_id"),
+    ],
+    "children": [
+        IndexModel([("child_id", ASCENDING)], name="child_id_unique", unique=True),
+        IndexModel([("code", ASCENDING)], name="code_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "reviews": [
+        IndexModel([("child_id", ASCENDING)], name="child_id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)], name="status_id"),
+    ],
+    "chat_sessions": [
+        IndexModel([("test_id", ASCENDING)], name="test_id_unique", unique=True),
+    ],
+    "vector_responses": [
+        IndexModel([("test_id", ASCENDING), ("question_index", ASCENDING), ("turn", ASCENDING)],
+                   name="test_question_turn_unique", unique=True),
+    ],
+    "llm_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=LLM_CACHE_TTL_DAYS * 86400),
+    ],
+    "jobs": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("run_after", ASCENDING)], name="status_run_after"),
+        IndexModel([("child_id", ASCENDING), ("created_at", ASCENDING)], name="child_created"),
+    ],
+}
+
+
+def _spec_of(info: dict) -> dict:
+    """Comparable shape of an index, from either IndexModel.document or index_information()"""
+    key = info["key"]
+    key = list(key.items()) if isinstance(key, dict) else [tuple(k) for k in key]
+    return {"key": key, "unique": bool(info.get("unique", False))}
+
+
+def index_drift(db) -> Dict[str, Dict[str, list]]:
+    """Compare declared indexes with the server: missing, mismatched (same name, other spec) and undeclared"""
+    report = {}
+    for collection_name, models in INDEX_SPECS.items():
+        existing = db[collection_name].index_information()
+        declared = {m.document["name"]: _spec_of(m.document) for m in models}
+        missing, mismatched = [], []
+        for name, spec in declared.items():
+            if name not in existing:
+                missing.append(name)
+            elif _spec_of(existing[name]) != spec:
+                mismatched.append(name)
+        extra = [name for name in existing if name != "_id_" and name not in declared]
+        if missing or mismatched or extra:
+            report[collection_name] = {"missing": missing, "mismatched": mismatched, "extra": extra}
+    return report
+
+
+def ensure_indexes(db) -> Dict[str, Dict[str, list]]:
+    """Create any missing declared indexes (never drops anything) and return the remaining drift"""
+    for collection_name, models in INDEX_SPECS.items():
+        existing = db[collection_name].index_information()
+        to_create = [m for m in models if m.document["name"] not in existing]
+        for model in to_create:
+            try:
+                db[collection_name].create_indexes([model])
+                print(f"[Mongo] Created index {collection_name}.{model.document['name']}")
+            except OperationFailure as e:
+                # e.g. duplicate keys blocking a unique index - leave it reported as drift
+                print(f"[Mongo] Could not create index {collection_name}.{model.document['name']}: {e}")
+
+    drift = index_drift(db)
+    for collection_name, entry in drift.items():
+        print(f"[Mongo] Index drift on {collection_name}: {entry}")
+    return drift
+
+
+# ---------------------------- QUERY PLAN AUDIT ----------------------------
+def _plan_stages(plan: dict) -> List[str]:
+    stages = [plan.get("stage", "")]
+    for child_key in ("inputStage", "outerStage", "innerStage"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def winning_plan_stages(explain: dict) -> List[str]:
+    """Flatten the winning plan's stages from a find() or aggregate() explain document"""
+    planner = explain.get("queryPlanner")
+    if planner is None:
+        # aggregate explain: the $cursor stage (or the first shard) holds the planner output
+        for stage in explain.get("stages", []):
+            if "$cursor" in stage:
+                planner = stage["$cursor"].get("queryPlanner")
+                break
+    if planner is None:
+        return []
+    plan = planner.get("winningPlan", {})
+    return _plan_stages(plan.get("queryPlan", plan))
+
+
+def explain_find(collection, query: dict, sort: Optional[list] = None) -> List[str]:
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    return winning_plan_stages(cursor.explain())
+
+
+_audited = set()
+_audit_lock = threading.Lock()
+
+
+def audit_query(collection, query: dict, sort: Optional[list] = None):
+    """Explain each query shape once per process and warn if it scans the whole collection"""
+    shape = (collection.name, tuple(sorted(query)), tuple(k for k, _ in sort or []))
+    with _audit_lock:
+        if shape in _audited:
+            return
+        _audited.add(shape)
+    try:
+        stages = explain_find(collection, query, sort)
+    except Exception as e:
+        print(f"[Mongo audit] explain failed for {shape}: {e}")
+        return
+    if "COLLSCAN" in stages:
+        print(f"[Mongo audit] COLLSCAN on {collection.name} for filter {sorted(query)} sort {sort}: {stages}")
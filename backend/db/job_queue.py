@@ -0,0 +1,209 @@
+# db/job_queue.py
+#
+# Small Mongo-backed job queue, so background work (scoring, review summaries) needs no
+# external broker and survives restarts. Jobs live in the jobs collection:
+#   key        idempotency key (unique); enqueueing an existing key is a no-op
+#   status     queued -> running -> done | failed
+#   attempts   incremented on every claim; failures are retried with exponential backoff
+#              until JOB_MAX_ATTEMPTS
+#   locked_until  lease of the worker running it; a job whose lease expired (worker died)
+#              is claimed again, or failed if that was its last attempt
+# Workers claim with find_one_and_update, so any number of processes can share the queue.
+
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db.mongo_handler import jobs_collection
+
+JOB_WORKER_ENABLED = os.getenv("JOB_WORKER_ENABLED", "1") == "1"
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+
+_handlers: Dict[str, Callable[[dict], Optional[dict]]] = {}
+
+
+def register_job(job_type: str):
+    """Decorator: handler(payload) -> optional result dict, raising to have the job retried"""
+    def decorator(handler):
+        _handlers[job_type] = handler
+        return handler
+    return decorator
+
+
+def enqueue(job_type: str, payload: dict, key: str, child_id: Optional[str] = None,
+            max_attempts: int = JOB_MAX_ATTEMPTS, run_after: Optional[datetime] = None) -> str:
+    """Queue a job unless one with this idempotency key already exists; returns the key"""
+    now = datetime.utcnow()
+    try:
+        jobs_collection.update_one(
+            {"key": key},
+            {"$setOnInsert": {
+                "key": key,
+                "type": job_type,
+                "payload": payload,
+                "child_id": child_id,
+                "status": "queued",
+                "attempts": 0,
+                "max_attempts": max_attempts,
+                "run_after": run_after or now,
+                "locked_until": None,
+                "last_error": None,
+                "result": None,
+                "created_at": now,
+                "updated_at": now
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Two enqueues raced on the upsert; the other one created it
+        pass
+    return key
+
+
+def fail_abandoned(now: datetime) -> int:
+    """Fail expired leases that already used their last attempt (the worker died mid-job)"""
+    result = jobs_collection.update_many(
+        {"status": "running", "locked_until": {"$lt": now},
+         "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+        {"$set": {"status": "failed", "locked_until": None, "updated_at": now,
+                  "last_error": "Lease expired on the last attempt (worker stopped or crashed)"}}
+    )
+    return result.modified_count
+
+
+def claim(worker_id: str) -> Optional[dict]:
+    now = datetime.utcnow()
+    fail_abandoned(now)
+    return jobs_collection.find_one_and_update(
+        {"$or": [
+            {"status": "queued", "run_after": {"$lte": now}},
+            {"status": "running", "locked_until": {"$lt": now},
+             "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+        ]},
+        {
+            "$set": {"status": "running", "locked_until": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                     "worker": worker_id, "updated_at": now},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_after", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def complete(job: dict, result: Optional[dict] = None):
+    jobs_collection.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": "done", "result": result, "locked_until": None, "last_error": None,
+                  "updated_at": datetime.utcnow()}}
+    )
+
+
+def fail(job: dict, error: str):
+    now = datetime.utcnow()
+    if job["attempts"] >= job.get("max_attempts", JOB_MAX_ATTEMPTS):
+        update = {"status": "failed"}
+    else:
+        backoff = JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1)
+        update = {"status": "queued", "run_after": now + timedelta(seconds=backoff)}
+    update.update({"locked_until": None, "last_error": error, "updated_at": now})
+    jobs_collection.update_one({"_id": job["_id"]}, {"$set": update})
+
+
+def retry_failed(key: str) -> bool:
+    """Put a failed job back in the queue with a fresh attempt budget"""
+    result = jobs_collection.update_one(
+        {"key": key, "status": "failed"},
+        {"$set": {"status": "queued", "attempts": 0, "run_after": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+    )
+    return result.modified_count > 0
+
+
+def run_job(job: dict):
+    handler = _handlers.get(job["type"])
+    if handler is None:
+        fail(job, f"No handler registered for job type {job['type']}")
+        return
+    try:
+        complete(job, handler(job["payload"]))
+        print(f"[Jobs] {job['key']} done (attempt {job['attempts']})")
+    except Exception as e:
+        traceback.print_exc()
+        fail(job, str(e))
+        print(f"[Jobs] {job['key']} failed (attempt {job['attempts']}): {e}")
+
+
+def run_pending(worker_id: str = "inline", limit: int = 0) -> int:
+    """Run claimable jobs until none are left (or `limit` ran); returns how many ran"""
+    ran = 0
+    while not limit or ran < limit:
+        job = claim(worker_id)
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def get_jobs_for_child(child_id: str) -> List[dict]:
+    return list(jobs_collection.find(
+        {"child_id": child_id},
+        {"_id": 0, "key": 1, "type": 1, "status": 1, "attempts": 1, "last_error": 1, "updated_at": 1}
+    ).sort("created_at", 1))
+
+
+class JobWorker:
+    """Background thread that polls the jobs collection and runs whatever it can claim"""
+
+    def __init__(self, poll_interval: float = JOB_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="job-worker", daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """Skip the rest of the poll interval, e.g. right after enqueueing"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ran = run_pending(self.worker_id, limit=1)
+            except Exception as e:
+                print(f"[Jobs] Worker error: {e}")
+                ran = 0
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def stop(self, timeout: float = 30.0):
+        # A job interrupted here keeps its lease and is picked up again once it expires
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+
+job_worker = JobWorker()
+
+def start_job_worker():
+    if JOB_WORKER_ENABLED:
+        job_worker.start()
+
+def stop_job_worker():
+    job_worker.stop()
@@ -0,0 +1,190 @@
+# db/mongo_config.py
+#
+# Mongo client factory shared by the blocking client (db/mongo_handler.py, scripts, jobs)
+# and the asyncio client (db/async_repository.py, request handlers). Everything is driven
+# by environment variables; both clients report connection-pool usage to pool_metrics.
+#
+# Keep MONGO_READ_PREFERENCE at "primary" unless stale reads are acceptable: the chat
+# session store and the submit flow read their own writes. Read-heavy listings
+# (/test/summary, /reviews/*) use MONGO_DASHBOARD_READ_PREFERENCE instead, which can
+# point them at secondaries of a replica set.
+
+import os
+import threading
+import importlib.util
+from typing import Dict, Optional
+from pymongo import MongoClient, AsyncMongoClient, monitoring
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "sdq_test_db")
+MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "sdq-backend")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# 0 = no socket timeout (pymongo's default)
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+# How long a request may wait for a free pooled connection (0 = forever)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
+MONGO_RETRY_WRITES = os.getenv("MONGO_RETRY_WRITES", "1") == "1"
+MONGO_RETRY_READS = os.getenv("MONGO_RETRY_READS", "1") == "1"
+# Comma-separated, in order of preference: zstd (needs zstandard), snappy (needs python-snappy), zlib
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+MONGO_DASHBOARD_READ_PREFERENCE = os.getenv("MONGO_DASHBOARD_READ_PREFERENCE", MONGO_READ_PREFERENCE)
+# Secondaries lagging more than this are not used for dashboard reads (-1 = no limit; min 90)
+MONGO_DASHBOARD_MAX_STALENESS_S = int(os.getenv("MONGO_DASHBOARD_MAX_STALENESS_S", "-1"))
+
+_COMPRESSOR_PACKAGES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+_READ_PREFERENCES = {
+    "primarypreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondarypreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def available_compressors(requested: str = MONGO_COMPRESSORS) -> list:
+    """Requested compressors whose Python package is installed; the server picks the first it supports"""
+    compressors = []
+    for name in (c.strip().lower() for c in requested.split(",") if c.strip()):
+        package = _COMPRESSOR_PACKAGES.get(name)
+        if package is None:
+            print(f"[Mongo] Unknown compressor {name!r} ignored")
+        elif importlib.util.find_spec(package) is None:
+            print(f"[Mongo] Compressor {name} needs the {package} package; skipping it")
+        else:
+            compressors.append(name)
+    return compressors
+
+
+def read_preference(mode: str, max_staleness: int = -1):
+    if mode.lower() == "primary":
+        return Primary()
+    cls = _READ_PREFERENCES.get(mode.lower())
+    if cls is None:
+        raise ValueError(f"Unknown read preference: {mode}")
+    return cls(max_staleness=max_staleness)
+
+
+def dashboard_read_preference():
+    return read_preference(MONGO_DASHBOARD_READ_PREFERENCE, MONGO_DASHBOARD_MAX_STALENESS_S)
+
+
+def client_options() -> dict:
+    options = {
+        "appname": MONGO_APP_NAME,
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "retryWrites": MONGO_RETRY_WRITES,
+        "retryReads": MONGO_RETRY_READS,
+        # Resolved like the dashboard's: the client option itself is case-sensitive
+        "readPreference": read_preference(MONGO_READ_PREFERENCE).mongos_mode,
+    }
+    if MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = MONGO_SOCKET_TIMEOUT_MS
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    compressors = available_compressors()
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+# ---------------------------- POOL METRICS ----------------------------
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool counters per client and server address, for sizing maxPoolSize under load"""
+
+    def __init__(self, client_name: str):
+        self.client_name = client_name
+        self._lock = threading.Lock()
+        self._pools: Dict[str, dict] = {}
+
+    def _pool(self, address) -> dict:
+        key = f"{address[0]}:{address[1]}"
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = {
+                "open": 0, "in_use": 0, "peak_in_use": 0, "waiting": 0, "peak_waiting": 0,
+                "checkouts": 0, "checkout_failures": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0,
+                "cleared": 0,
+            }
+        return pool
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            pool = self._pool(address)
+            for field, delta in deltas.items():
+                pool[field] += delta
+            pool["peak_in_use"] = max(pool["peak_in_use"], pool["in_use"])
+            pool["peak_waiting"] = max(pool["peak_waiting"], pool["waiting"])
+
+    def connection_created(self, event):
+        self._update(event.address, open=1)
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_checked_out(self, event):
+        # duration (seconds) is reported by pymongo >= 4.7
+        wait_ms = (getattr(event, "duration", None) or 0.0) * 1000
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["waiting"] -= 1
+            pool["in_use"] += 1
+            pool["checkouts"] += 1
+            pool["wait_ms_total"] += wait_ms
+            pool["wait_ms_max"] = max(pool["wait_ms_max"], wait_ms)
+            pool["peak_in_use"] = max(pool["peak_in_use"], pool["in_use"])
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1, checkout_failures=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            pools = {}
+            for address, pool in self._pools.items():
+                entry = dict(pool)
+                entry["utilization"] = pool["in_use"] / MONGO_MAX_POOL_SIZE
+                entry["peak_utilization"] = pool["peak_in_use"] / MONGO_MAX_POOL_SIZE
+                entry["wait_ms_avg"] = pool["wait_ms_total"] / pool["checkouts"] if pool["checkouts"] else 0.0
+                pools[address] = entry
+            return {"client": self.client_name, "max_pool_size": MONGO_MAX_POOL_SIZE, "pools": pools}
+
+
+pool_metrics = {"sync": PoolMetrics("sync"), "async": PoolMetrics("async")}
+
+
+def create_client(async_client: bool = False, uri: Optional[str] = None):
+    """MongoClient (or AsyncMongoClient) configured from the environment, with pool metrics attached"""
+    cls = AsyncMongoClient if async_client else MongoClient
+    metrics = pool_metrics["async" if async_client else "sync"]
+    return cls(uri or MONGO_URI, event_listeners=[metrics], **client_options())
+
+
+def get_pool_stats() -> dict:
+    return {name: metrics.stats() for name, metrics in pool_metrics.items()}
@@ -1,9 +1,26 @@
 # db/mongo_handler.py
-from pymongo import MongoClient
+import os
+import json
+import hashlib
+import numpy as np
+from pymongo import UpdateOne
 from datetime import datetime
-from services.llm_chat import query_llm
-from core.prompt_builder import build_summary_prompt, get_questions_for_age
-from bson import ObjectId
+from services.llm_dispatcher import query_llm_sync
+from core.prompt_builder import (
+    build_summary_prompt, build_respondent_summary_prompt, build_combined_summary_prompt, get_questions_for_age
+)
+from bson import ObjectId, Binary
+from db.accessors import (
+    Fields, find_one_fields, find_fields,
+    USER_AUTH, CHILD_PROFILE, CHILD_NAME, CHILD_CODE,
+    TEST_STATUS, TEST_ID, TEST_CHILD, TEST_LISTING, TEST_SUMMARY, TEST_SUMMARY_SCORES, TEST_DETAIL,
+    REVIEW_STATUS, REVIEW_RESULT, REVIEW_SUMMARY_STATE
+)
+from db import child_cache
+from db.mongo_config import MONGO_DB, create_client, dashboard_read_preference
+from db.pipelines import (
+    child_tests_summary_pipeline, review_listing_pipeline, page_size, split_page
+)
 
 def clean_mongo_obj(doc):
     """Convert ObjectId to string and handle other non-JSON-safe types."""
@@ -13,14 +30,20 @@ def clean_mongo_obj(doc):
     doc["_id"] = str(doc["_id"])
     return doc
 
-client = MongoClient("mongodb://localhost:27017")
-db = client["sdq_test_db"]
+client = create_client()
+db = client[MONGO_DB]
 
 tests_collection = db["tests"]
 children_collection = db["children"]
 users_collection = db["users"]
 reviews_collection = db["reviews"]
 vector_responses_collection = db["vector_responses"]
+chat_sessions_collection = db["chat_sessions"]
+llm_cache_collection = db["llm_cache"]
+jobs_collection = db["jobs"]
+
+# Chat embeddings live in vector_responses as packed bytes ("float16" or "int8"), never in tests
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")
 
 # ---------------------------- AUTHENTICATION ----------------------------
 def create_user(email, password_hash, role):
@@ -32,8 +55,8 @@ def create_user(email, password_hash, role):
     }
     users_collection.insert_one(user)
 
-def get_user_by_email(email):
-    return users_collection.find_one({"email": email})
+def get_user_by_email(email, fields: Fields = USER_AUTH):
+    return find_one_fields(users_collection, {"email": email}, fields)
 
 # ---------------------------- CHILD REGISTRATION FUNCTIONS ----------------------------
 def register_child(child_id, name, age, gender, code, email):
@@ -46,59 +69,45 @@ def register_child(child_id, name, age, gender, code, email):
         "email": email,
         "registered_on": datetime.utcnow()
     })
+    child_cache.invalidate(child_id, code)
+
+def _cached_child(key_field, value, fields: Fields):
+    """Read-through db/child_cache.py lookup by child_id or code"""
+    if not child_cache.cacheable(fields):
+        return find_one_fields(children_collection, {key_field: value}, fields)
+    child = child_cache.lookup(key_field, value, fields)
+    if child is None:
+        child = child_cache.remember(find_one_fields(children_collection, {key_field: value}, CHILD_PROFILE), fields)
+    return child
 
-def login_child_by_code(code):
-    return children_collection.find_one({"code": code})
+def login_child_by_code(code, fields: Fields = CHILD_PROFILE):
+    return _cached_child("code", code, fields)
 
-def get_child_by_id(child_id):
+def get_child_by_id(child_id, fields: Fields = CHILD_PROFILE):
     """Get child data by child_id"""
-    return children_collection.find_one({"child_id": child_id})
+    return _cached_child("child_id", child_id, fields)
 
 def get_child_code(child_id):
     """Get sharing code for a child"""
-    child = children_collection.find_one({"child_id": child_id})
+    child = _cached_child("child_id", child_id, CHILD_CODE)
     return child.get("code") if child else None
 
 # ---------------------------- DASHBOARD FUNCTIONS ----------------------------
+def get_child_tests_summary_page(email, role, limit=None, after=None):
+    """One page of a parent/teacher dashboard (tests grouped by child) and the cursor for the next page"""
+    limit = page_size(limit)
+    tests = tests_collection.with_options(read_preference=dashboard_read_preference())
+    docs = list(tests.aggregate(child_tests_summary_pipeline(email, role, after, limit)))
+    docs, next_cursor = split_page(docs, limit, cursor_field="first_test")
+    for doc in docs:
+        doc.pop("first_test", None)
+    return docs, next_cursor
+
 def get_child_tests_summary(email, role):
     """Get dashboard summary for parent/teacher - groups tests by child"""
     try:
-        user_tests = list(tests_collection.find({
-            "email": email,
-            "respondent_type": role
-        }))
-        
-        if not user_tests:
-            return None
-            
-        children_data = {}
-        
-        for test in user_tests:
-            child_id = test["child_id"]
-            
-            if child_id not in children_data:
-                child_info = get_child_by_id(child_id)
-                children_data[child_id] = {
-                    "child_id": child_id,
-                    "child_name": child_info.get("name", "Unknown") if child_info else "Unknown",
-                    "tests": [],
-                    "review_status": "pending"
-                }
-            
-            children_data[child_id]["tests"].append({
-                "test_id": test["test_id"],
-                "respondent_type": test["respondent_type"],
-                "email": test["email"],
-                "submitted": test.get("submitted", False),
-                "created_at": test.get("created_at", "")
-            })
-        
-        for child_id in children_data:
-            review = reviews_collection.find_one({"child_id": child_id})
-            if review and review.get("status") == "reviewed":
-                children_data[child_id]["review_status"] = "reviewed"
-
-        return list(children_data.values())
+        children_data, _ = get_child_tests_summary_page(email, role)
+        return children_data or None
         
     except Exception as e:
         print(f"Error in get_child_tests_summary: {e}")
@@ -107,21 +116,19 @@ def get_child_tests_summary(email, role):
 def get_test_results_for_user(child_id, email, role):
     """Get test results for a specific child (only if review is completed)"""
     try:
-        review = reviews_collection.find_one({"child_id": child_id})
+        review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_RESULT)
         if not review or review.get("status") != "reviewed":
             return None
             
-        child_info = get_child_by_id(child_id)
+        child_info = get_child_by_id(child_id, CHILD_NAME)
         if not child_info:
             return None
             
-        all_tests = list(tests_collection.find({"child_id": child_id}))
-        
-        user_test = None
-        for test in all_tests:
-            if test.get("email") == email and test.get("respondent_type") == role:
-                user_test = test
-                break
+        user_test = find_one_fields(tests_collection, {
+            "child_id": child_id,
+            "email": email,
+            "respondent_type": role
+        }, Fields("test_user_result", "test_id", "scores"))
                 
         if not user_test:
             return None
@@ -143,10 +150,10 @@ def get_test_results_for_user(child_id, email, role):
 
 # ---------------------------- TEST MANAGEMENT FUNCTIONS ----------------------------
 def get_tests_by_respondent(email, role):
-    user_tests = list(tests_collection.find({
+    user_tests = find_fields(tests_collection, {
         "respondent_type": role,
         "email": email
-    }))
+    }, TEST_LISTING)
     return user_tests
 
 def create_test_entry(test_id, age, child_name, child_id, respondent_type, email):
@@ -160,7 +167,6 @@ def create_test_entry(test_id, age, child_name, child_id, respondent_type, email
         "email": email,
         "submitted": False,
         "confirm_options": [],
-        "vector_responses": [],
         "scores": None,
         "created_at": datetime.utcnow()
     })
@@ -182,19 +188,63 @@ def store_response(test_id, question_index, question, selected_option):
         }
     )
 
-def store_vector_response(test_id, question_index, vector, text):
-    tests_collection.update_one(
-        { "test_id": test_id },
-        {
-            "$push": {
-                "vector_responses": {
-                    "question_index": question_index,
-                    "text": text,
-                    "embedding": vector
-                }
-            }
-        }
-    )
+def pack_embedding(vector, dtype=VECTOR_DTYPE):
+    """Encode an embedding as compact bytes: float16, or int8 scaled by 127 (embeddings are unit length)"""
+    array = np.asarray(vector, dtype=np.float32)
+    if dtype == "int8":
+        packed = np.clip(np.round(array * 127), -127, 127).astype(np.int8)
+    else:
+        packed = array.astype(np.float16)
+    return Binary(packed.tobytes())
+
+def unpack_embedding(doc):
+    """Decode the embedding of a vector_responses document back to a float list"""
+    raw = doc.get("embedding")
+    if raw is None:
+        return None
+    if isinstance(raw, list):
+        return raw
+    if doc.get("dtype") == "int8":
+        return (np.frombuffer(raw, dtype=np.int8).astype(np.float32) / 127).tolist()
+    return np.frombuffer(raw, dtype=np.float16).astype(np.float32).tolist()
+
+def vector_response_doc(test_id, question_index, turn, text, vector):
+    """`turn` is the message's chat session version (core/session_store.py), unique per test"""
+    return {
+        "test_id": test_id,
+        "question_index": question_index,
+        "turn": turn,
+        "text": text,
+        "embedding": pack_embedding(vector) if vector else None,
+        "dtype": VECTOR_DTYPE,
+        "dim": len(vector) if vector else 0,
+        "created_at": datetime.utcnow()
+    }
+
+def store_vector_response(test_id, question_index, vector, text, turn):
+    store_vector_responses_bulk([{
+        "test_id": test_id, "question_index": question_index, "turn": turn, "text": text, "embedding": vector
+    }])
+
+def store_vector_responses_bulk(records):
+    """Write many chat embeddings with one unordered bulk write, idempotent per (test_id, question_index, turn)"""
+    if not records:
+        return
+    vector_responses_collection.bulk_write([
+        UpdateOne(
+            {"test_id": r["test_id"], "question_index": r["question_index"], "turn": r["turn"]},
+            {"$setOnInsert": vector_response_doc(r["test_id"], r["question_index"], r["turn"], r["text"], r["embedding"])},
+            upsert=True
+        )
+        for r in records
+    ], ordered=False)
+
+def get_vector_texts(test_id):
+    """Chat messages stored for a test, without embeddings, in conversation order"""
+    return list(vector_responses_collection.find(
+        {"test_id": test_id, "turn": {"$exists": True}},
+        {"_id": 0, "question_index": 1, "turn": 1, "text": 1}
+    ).sort([("question_index", 1), ("turn", 1)]))
 
 def mark_test_submitted(test_id):
     result = tests_collection.update_one(
@@ -222,6 +272,47 @@ def generate_score(test_id):
         print(f"Error generating score for test {test_id}: {e}")
         raise e
 
+def store_scores_bulk(score_docs):
+    """Write many tests.scores with one unordered bulk write (rescoring backfills)"""
+    if not score_docs:
+        return
+    tests_collection.bulk_write([
+        UpdateOne({"test_id": doc["test_id"]}, {"$set": {"scores": doc}})
+        for doc in score_docs
+    ], ordered=False)
+
+def refresh_review_scores(child_ids):
+    """Copy the current per-respondent test scores into the reviews of these children"""
+    child_ids = list(set(child_ids))
+    if not child_ids:
+        return 0
+    scores = {}
+    for t in find_fields(tests_collection, {"child_id": {"$in": child_ids}, "submitted": True}, TEST_SUMMARY_SCORES):
+        scores.setdefault(t["child_id"], {})[t["respondent_type"]] = t.get("scores", {})
+    result = reviews_collection.bulk_write([
+        UpdateOne({"child_id": child_id}, {"$set": {"scores": child_scores}})
+        for child_id, child_scores in scores.items()
+    ], ordered=False) if scores else None
+    return result.modified_count if result else 0
+
+def refresh_pending_summary(child_id):
+    """Regenerate the AI summary of a review no psychologist has worked on yet (status still pending)"""
+    review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_SUMMARY_STATE)
+    if not review or review.get("status") != "pending":
+        return False
+    all_tests = find_fields(tests_collection, {"child_id": child_id, "submitted": True}, TEST_SUMMARY)
+    try:
+        summary_fields = build_review_summary(all_tests, get_child_by_id(child_id), review)
+    except SummaryUnavailable as e:
+        summary_fields = e.fields
+    if summary_fields is None:
+        return False
+    update = dict(summary_fields)
+    if review.get("psychologist_review") in (None, review.get("ai_generated_summary")):
+        update["psychologist_review"] = summary_fields["ai_generated_summary"]
+    reviews_collection.update_one({"child_id": child_id, "status": "pending"}, {"$set": update})
+    return True
+
 def check_all_submitted(child_id):
     submitted_roles = tests_collection.find({
         "child_id": child_id,
@@ -230,33 +321,89 @@ def check_all_submitted(child_id):
 
     return all(role in submitted_roles for role in ["child", "parent", "teacher"])
 
+def fallback_summary(all_tests, child_info):
+    """Plain summary used when the LLM is unavailable"""
+    total_responses = vector_responses_collection.count_documents(
+        {"test_id": {"$in": [test["test_id"] for test in all_tests]}}
+    )
+    avg_score = sum(test.get("scores", {}).get("total_score", 0) for test in all_tests) / len(all_tests)
+    
+    return f"""
+Assessment Summary for {child_info.get('name', 'Child')} (Age: {child_info.get('age', 'Unknown')}):
+
+• Total test responses analyzed: {total_responses}
+• Average SDQ score across all respondents: {avg_score:.1f}/50
+• Assessment completed by: {', '.join([test['respondent_type'].title() for test in all_tests])}
+
+Based on the responses from child, parent, and teacher perspectives, this assessment provides insights into the child's behavioral and emotional wellbeing. The psychologist will review these findings and provide detailed recommendations.
+
+Generated on: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
+    """.strip()
+
 def generate_ai_summary(all_tests, child_info):
     """Generate AI summary using LLM with proper prompt"""
     try:
         prompt = build_summary_prompt(all_tests, child_info)
-        summary = query_llm(prompt)
+        summary = query_llm_sync(prompt)
         return summary
     except Exception as e:
         print(f"Error generating AI summary: {e}")
         # Fallback to simple summary
-        total_responses = sum(len(test.get("vector_responses", [])) for test in all_tests)
-        avg_score = sum(test.get("scores", {}).get("total_score", 0) for test in all_tests) / len(all_tests)
-        
-        return f"""
-Assessment Summary for {child_info.get('name', 'Child')} (Age: {child_info.get('age', 'Unknown')}):
-
-• Total test responses analyzed: {total_responses}
-• Average SDQ score across all respondents: {avg_score:.1f}/50
-• Assessment completed by: {', '.join([test['respondent_type'].title() for test in all_tests])}
+        return fallback_summary(all_tests, child_info)
+
+class SummaryUnavailable(Exception):
+    """The LLM summary could not be generated; `fields` holds the template fallback to store meanwhile"""
+
+    def __init__(self, error, fields):
+        super().__init__(f"AI summary unavailable: {error}")
+        self.fields = fields
+
+def summary_input_hash(test):
+    """Fingerprint of everything a respondent's partial summary is built from"""
+    scores = test.get("scores") or {}
+    inputs = {
+        "total_score": scores.get("total_score"),
+        "subscale_scores": scores.get("subscale_scores"),
+        "answers": [[r.get("question_index"), r.get("selected_option")] for r in test.get("confirm_options", [])]
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def build_review_summary(all_tests, child_info, review=None):
+    """
+    Incremental review summary: only respondents whose inputs changed since the stored
+    summary_inputs are re-summarized, then the partial summaries are merged.
+    Returns the fields to $set on the review, or None when nothing changed.
+    Raises SummaryUnavailable (carrying the template fallback) when the LLM fails.
+    """
+    hashes = {t["respondent_type"]: summary_input_hash(t) for t in all_tests}
+    review = review or {}
+    old_hashes = review.get("summary_inputs") or {}
+    partials = {r: text for r, text in (review.get("partial_summaries") or {}).items() if r in hashes}
+    if review.get("ai_generated_summary") and hashes == old_hashes and set(partials) == set(hashes):
+        return None
 
-Based on the responses from child, parent, and teacher perspectives, this assessment provides insights into the child's behavioral and emotional wellbeing. The psychologist will review these findings and provide detailed recommendations.
+    changed = [t for t in all_tests if old_hashes.get(t["respondent_type"]) != hashes[t["respondent_type"]]
+               or t["respondent_type"] not in partials]
+    try:
+        for test in changed:
+            partials[test["respondent_type"]] = query_llm_sync(build_respondent_summary_prompt(test, child_info))
+        ai_summary = query_llm_sync(build_combined_summary_prompt(partials, child_info))
+    except Exception as e:
+        print(f"Error generating AI summary: {e}")
+        # Nothing is recorded as summarized, so the next run tries the LLM again
+        raise SummaryUnavailable(e, {"ai_generated_summary": fallback_summary(all_tests, child_info)}) from e
 
-Generated on: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC
-        """.strip()
+    print(f"Re-summarized {[t['respondent_type'] for t in changed]} for child {child_info.get('child_id')}")
+    return {
+        "ai_generated_summary": ai_summary,
+        "partial_summaries": partials,
+        "summary_inputs": hashes,
+        "summary_updated_at": datetime.utcnow()
+    }
 
 def create_review_if_ready(test_id):
     """Create review document when all three parties have submitted"""
-    test = tests_collection.find_one({"test_id": test_id})
+    test = find_one_fields(tests_collection, {"test_id": test_id}, TEST_CHILD)
     if not test:
         return False
         
@@ -266,12 +413,12 @@ def create_review_if_ready(test_id):
         print(f"Not all parties submitted for child {child_id}")
         return False
 
-    existing = reviews_collection.find_one({"child_id": child_id})
+    existing = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_STATUS)
     if existing:
         print(f"Review already exists for child {child_id}")
         return False
 
-    all_tests = list(tests_collection.find({"child_id": child_id}))
+    all_tests = find_fields(tests_collection, {"child_id": child_id}, TEST_SUMMARY)
     child_info = get_child_by_id(child_id)
     
     test_ids = {}
@@ -302,7 +449,7 @@ def create_review_if_ready(test_id):
     return True
 
 def get_review_status(child_id):
-    review = reviews_collection.find_one({"child_id": child_id})
+    review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_RESULT)
     if not review:
         return {"status": "waiting", "message": "Review not generated yet."}
 
@@ -312,39 +459,23 @@ def get_review_status(child_id):
     }
 
 # ---------------------------- PSYCHOLOGIST FUNCTIONS ----------------------------
-def get_pending_reviews():
+def get_reviews_page(status, limit=None, after=None):
+    """One page of reviews with the given status (child names joined in) and the cursor for the next page"""
+    limit = page_size(limit)
+    reviews = reviews_collection.with_options(read_preference=dashboard_read_preference())
+    docs = list(reviews.aggregate(review_listing_pipeline(status, after, limit)))
+    docs, next_cursor = split_page(docs, limit)
+    for doc in docs:
+        doc.pop("_id", None)
+    return docs, next_cursor
+
+def get_pending_reviews(limit=None, after=None):
     """Get all reviews pending psychologist review"""
-    reviews = reviews_collection.find({"status": "pending"})
-    result = []
-
-    for review in reviews:
-        child_info = get_child_by_id(review["child_id"])
-        result.append({
-            "child_id": review["child_id"],
-            "name": child_info.get("name", "Unknown") if child_info else "Unknown",
-            "date": review.get("submitted_at", "Unknown"),
-            "screeningType": "SDQ",
-            "status": "pending"
-        })
-
-    return result
+    return get_reviews_page("pending", limit, after)[0]
 
-def get_completed_reviews():
+def get_completed_reviews(limit=None, after=None):
     """Get all completed psychologist reviews"""
-    reviews = reviews_collection.find({"status": "reviewed"})
-    result = []
-
-    for review in reviews:
-        child_info = get_child_by_id(review["child_id"])
-        result.append({
-            "child_id": review["child_id"],
-            "name": child_info.get("name", "Unknown") if child_info else "Unknown",
-            "date": review.get("reviewed_at", review.get("submitted_at", "Unknown")),
-            "screeningType": "SDQ",
-            "status": "reviewed"
-        })
-
-    return result
+    return get_reviews_page("reviewed", limit, after)[0]
 
 def get_full_review(child_id):
     """Get comprehensive test data for psychologist review with decoded chat history and questions"""
@@ -352,7 +483,7 @@ def get_full_review(child_id):
     if not review:
         raise Exception("Review not found.")
 
-    all_tests = list(tests_collection.find({"child_id": child_id}))
+    all_tests = find_fields(tests_collection, {"child_id": child_id}, TEST_DETAIL)
     test_map = {t["respondent_type"]: t for t in all_tests}
     child_info = get_child_by_id(child_id)
 
@@ -369,29 +500,25 @@ def get_full_review(child_id):
     for respondent_type, test_data in test_map.items():
         test_id = test_data.get("test_id")
         if test_id:
-            # Get vector responses from separate collection
-            vector_docs = list(vector_responses_collection.find({"test_id": test_id}))
             text_map = {}
-            
-            for doc in vector_docs:
+
+            # Legacy documents that grouped every message for a question under original_text
+            for doc in vector_responses_collection.find(
+                {"test_id": test_id, "original_text": {"$exists": True}},
+                {"_id": 0, "question_index": 1, "original_text": 1}
+            ):
                 q_index = doc.get("question_index")
-                original_text = doc.get("original_text", [])
                 if q_index is not None:
-                    text_map[q_index] = original_text
-
-            # Also check vector_responses in the test document itself
-            test_vector_responses = test_data.get("vector_responses", [])
-            for vr in test_vector_responses:
-                q_index = vr.get("question_index")
-                text = vr.get("text", "")
-                if q_index is not None and text:
-                    if q_index not in text_map:
-                        text_map[q_index] = []
-                    if isinstance(text, list):
-                        text_map[q_index].extend(text)
-                    else:
-                        text_map[q_index].append(text)
+                    text_map[q_index] = list(doc.get("original_text", []))
+
+            # One document per chat turn (embeddings are never loaded here)
+            vector_texts = get_vector_texts(test_id)
+            for vr in vector_texts:
+                text_map.setdefault(vr["question_index"], []).append(vr.get("text", ""))
 
+            test_data["vector_responses"] = [
+                {"question_index": vr["question_index"], "text": vr.get("text", "")} for vr in vector_texts
+            ]
             test_data["vector_responses_text"] = text_map
 
     return {
@@ -431,7 +558,7 @@ def submit_review(child_id, psychologist_review, reviewer_id):
 
 def get_final_review_for_user(child_id):
     """Get final review for end users (parent/teacher)"""
-    review = reviews_collection.find_one({"child_id": child_id})
+    review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_RESULT)
     if not review:
         raise Exception("No review found for this child.")
 
@@ -446,12 +573,12 @@ def get_final_review_for_user(child_id):
 # ---------------------------- UTILITY FUNCTIONS ----------------------------
 def find_existing_incomplete_test(child_id, respondent_type, email):
     """Find existing incomplete test for the same child, respondent type, and email"""
-    existing_test = tests_collection.find_one({
+    existing_test = find_one_fields(tests_collection, {
         "child_id": child_id,
         "respondent_type": respondent_type,
         "email": email,
         "submitted": False
-    })
+    }, TEST_ID)
     return existing_test
 
 def create_or_resume_test(child_id, age, child_name, respondent_type, email):
@@ -478,7 +605,6 @@ def create_or_resume_test(child_id, age, child_name, respondent_type, email):
         "email": email,
         "submitted": False,
         "confirm_options": [],
-        "vector_responses": [],
         "scores": None,
         "created_at": datetime.utcnow()
     })
@@ -489,21 +615,25 @@ def create_or_resume_test(child_id, age, child_name, respondent_type, email):
         "message": "Starting new test..."
     }
     
-def get_test_by_id(test_id):
-    """Get test data by test_id"""
-    test = tests_collection.find_one({"test_id": test_id})
+def get_test_by_id(test_id, fields: Fields = TEST_DETAIL):
+    """Get test data by test_id, limited to the given field set"""
+    test = find_one_fields(tests_collection, {"test_id": test_id}, fields)
     if not test:
         raise Exception(f"Test with id {test_id} not found")
     return test
 
+def get_test_status(test_id):
+    """Just test_id and submitted - the cheap check at the top of every chat turn"""
+    return get_test_by_id(test_id, TEST_STATUS)
+
 def upsert_review_and_generate_summary(test_id):
-    """Update or create review with new summary based on all submitted tests"""
-    test = get_test_by_id(test_id)
+    """Update or create the child's review; the AI summary is only regenerated for respondents whose inputs changed"""
+    test = get_test_by_id(test_id, TEST_CHILD)
     if not test:
         raise Exception("Invalid test_id")
 
     child_id = test["child_id"]
-    all_tests = list(tests_collection.find({"child_id": child_id, "submitted": True}))
+    all_tests = find_fields(tests_collection, {"child_id": child_id, "submitted": True}, TEST_SUMMARY)
     if not all_tests:
         print("No completed tests yet")
         return False
@@ -513,7 +643,7 @@ def upsert_review_and_generate_summary(test_id):
         print("Child info not found")
         return False
 
-    review = reviews_collection.find_one({"child_id": child_id})
+    review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_SUMMARY_STATE)
 
     test_ids = {}
     scores = {}
@@ -521,7 +651,11 @@ def upsert_review_and_generate_summary(test_id):
         test_ids[t["respondent_type"]] = t["test_id"]
         scores[t["respondent_type"]] = t.get("scores", {})
 
-    ai_summary = generate_ai_summary(all_tests, child_info)
+    summary_error = None
+    try:
+        summary_fields = build_review_summary(all_tests, child_info, review)
+    except SummaryUnavailable as e:
+        summary_error, summary_fields = e, e.fields
 
     if not review:
         reviews_collection.insert_one({
@@ -529,8 +663,8 @@ def upsert_review_and_generate_summary(test_id):
             "child_test_id": test_ids.get("child", ""),
             "parent_test_id": test_ids.get("parent", ""),
             "teacher_test_id": test_ids.get("teacher", ""),
-            "ai_generated_summary": ai_summary,
-            "psychologist_review": ai_summary,
+            **summary_fields,
+            "psychologist_review": summary_fields["ai_generated_summary"],
             "scores": scores,
             "status": "pending",
             "reviewed_by": None,
@@ -538,32 +672,37 @@ def upsert_review_and_generate_summary(test_id):
         })
         print(f"New review created for child {child_id}")
     else:
-        reviews_collection.update_one(
-            {"child_id": child_id},
-            {
-                "$set": {
-                    "child_test_id": test_ids.get("child", ""),
-                    "parent_test_id": test_ids.get("parent", ""),
-                    "teacher_test_id": test_ids.get("teacher", ""),
-                    "ai_generated_summary": ai_summary,
-                    "psychologist_review": ai_summary,
-                    "scores": scores,
-                    "submitted_at": datetime.utcnow()
-                }
-            }
-        )
+        update = {
+            "child_test_id": test_ids.get("child", ""),
+            "parent_test_id": test_ids.get("parent", ""),
+            "teacher_test_id": test_ids.get("teacher", ""),
+            "scores": scores,
+            "submitted_at": datetime.utcnow()
+        }
+        if summary_fields is None:
+            print(f"Summary inputs unchanged for child {child_id}, keeping the current summary")
+        else:
+            update.update(summary_fields)
+            # Only replace the draft while the psychologist has not started editing it
+            if review.get("status") == "pending" and review.get("psychologist_review") in (None, review.get("ai_generated_summary")):
+                update["psychologist_review"] = summary_fields["ai_generated_summary"]
+        reviews_collection.update_one({"child_id": child_id}, {"$set": update})
         print(f"Review updated for child {child_id}")
 
+    if summary_error is not None:
+        # The template stands in until a retry of the review_summary job reaches the LLM;
+        # once the job runs out of attempts the template is what stays
+        raise summary_error
     return True
 
 def login_child_by_email(email):
     """Fetch child data using email"""
-    return children_collection.find_one({"email": email})
+    return find_one_fields(children_collection, {"email": email}, CHILD_PROFILE)
 
 def get_results_by_child_id(child_id: str, user_email: str, user_role: str):
     """Get completed review results for a specific child"""
     try:
-        review = reviews_collection.find_one({"child_id": child_id})
+        review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_RESULT)
         
         if not review:
             raise Exception("No review found for this child")
@@ -571,16 +710,16 @@ def get_results_by_child_id(child_id: str, user_email: str, user_role: str):
         if review.get("status") != "reviewed":
             raise Exception("Review not completed yet")
 
-        user_test = tests_collection.find_one({
+        user_test = find_one_fields(tests_collection, {
             "child_id": child_id,
             "email": user_email,
             "respondent_type": user_role
-        })
+        }, Fields("test_user_result", "test_id", "scores", "created_at"))
         
         if not user_test:
             raise Exception("No test found for this user and child")
         
-        child = children_collection.find_one({"child_id": child_id})
+        child = get_child_by_id(child_id, CHILD_NAME)
         child_name = child.get("name", "Unknown") if child else "Unknown"
         
         result = {
@@ -605,7 +744,7 @@ def get_results_by_child_id(child_id: str, user_email: str, user_role: str):
 def get_review_status_by_child_id(child_id: str):
     """Get review status directly from reviews collection"""
     try:
-        review = reviews_collection.find_one({"child_id": child_id})
+        review = find_one_fields(reviews_collection, {"child_id": child_id}, REVIEW_STATUS)
         if review:
             return review.get("status")
         return None
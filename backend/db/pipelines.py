@@ -0,0 +1,118 @@
+# db/pipelines.py
+#
+# Aggregation pipelines for the dashboard and review listings. Each one joins children
+# (and reviews) with $lookup in a single round trip and pages with an _id cursor, so
+# latency stays flat as a psychologist's caseload or a parent's history grows.
+# ($lookup with both localField and a sub-pipeline needs MongoDB 5.0+.)
+
+from typing import List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def parse_cursor(after: Optional[str]) -> Optional[ObjectId]:
+    if not after:
+        return None
+    try:
+        return ObjectId(after)
+    except (InvalidId, TypeError):
+        raise ValueError(f"Invalid cursor: {after}")
+
+
+def page_size(limit: Optional[int]) -> Optional[int]:
+    if limit is None:
+        return None
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def split_page(docs: List[dict], limit: Optional[int], cursor_field: str = "_id") -> Tuple[List[dict], Optional[str]]:
+    """Pipelines fetch limit + 1 docs; the extra one only tells us there is a next page"""
+    if limit is None or len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, str(docs[-1][cursor_field])
+
+
+def _child_name_lookup() -> List[dict]:
+    return [
+        {"$lookup": {
+            "from": "children",
+            "localField": "child_id",
+            "foreignField": "child_id",
+            "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+            "as": "child"
+        }},
+        {"$set": {"child_name": {"$ifNull": [{"$arrayElemAt": ["$child.name", 0]}, "Unknown"]}}},
+    ]
+
+
+def review_listing_pipeline(status: str, after: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """Reviews with the given status plus the child's name, oldest first"""
+    match = {"status": status}
+    cursor = parse_cursor(after)
+    if cursor is not None:
+        match["_id"] = {"$gt": cursor}
+
+    date_field = "$submitted_at" if status == "pending" else {"$ifNull": ["$reviewed_at", "$submitted_at"]}
+    pipeline = [{"$match": match}, {"$sort": {"_id": 1}}]
+    if limit is not None:
+        pipeline.append({"$limit": limit + 1})
+    pipeline += _child_name_lookup() + [
+        {"$project": {
+            "_id": 1,
+            "child_id": 1,
+            "name": "$child_name",
+            "date": {"$ifNull": [date_field, "Unknown"]},
+            "screeningType": "SDQ",
+            "status": status
+        }},
+    ]
+    return pipeline
+
+
+def child_tests_summary_pipeline(email: str, role: str, after: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+    """A user's tests grouped per child, with the child's name and review status"""
+    pipeline = [
+        {"$match": {"email": email, "respondent_type": role}},
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": "$child_id",
+            "first_test": {"$first": "$_id"},
+            "tests": {"$push": {
+                "test_id": "$test_id",
+                "respondent_type": "$respondent_type",
+                "email": "$email",
+                "submitted": {"$ifNull": ["$submitted", False]},
+                "created_at": {"$ifNull": ["$created_at", ""]}
+            }}
+        }},
+    ]
+    cursor = parse_cursor(after)
+    if cursor is not None:
+        pipeline.append({"$match": {"first_test": {"$gt": cursor}}})
+    pipeline.append({"$sort": {"first_test": 1}})
+    if limit is not None:
+        pipeline.append({"$limit": limit + 1})
+    pipeline += [{"$set": {"child_id": "$_id"}}] + _child_name_lookup() + [
+        {"$lookup": {
+            "from": "reviews",
+            "localField": "child_id",
+            "foreignField": "child_id",
+            "pipeline": [{"$project": {"_id": 0, "status": 1}}],
+            "as": "review"
+        }},
+        {"$project": {
+            "_id": 0,
+            "first_test": 1,
+            "child_id": 1,
+            "child_name": 1,
+            "tests": 1,
+            "review_status": {"$cond": [
+                {"$eq": [{"$arrayElemAt": ["$review.status", 0]}, "reviewed"]}, "reviewed", "pending"
+            ]}
+        }},
+    ]
+    return pipeline
@@ -1,45 +1,162 @@
 
-from sentence_transformers import SentenceTransformer
-from db.mongo_handler import store_vector_response
+import os
+import time
+import queue
+import threading
+from typing import Optional
+import httpx
+from db.mongo_handler import store_vector_responses_bulk
+from db.embedding_backends import get_embedding_backend
 
-model=SentenceTransformer("all-MiniLM-L6-v2")  # Load once
+# When set, embeddings come from a shared sidecar process (see db/embedding_sidecar.py)
+# so API workers never load torch or the model weights themselves
+EMBEDDING_SIDECAR_URL = os.getenv("EMBEDDING_SIDECAR_URL")
+EMBEDDING_SIDECAR_TIMEOUT = float(os.getenv("EMBEDDING_SIDECAR_TIMEOUT", "10"))
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "0") == "1"
+
+# Background embedding worker settings
+EMBED_QUEUE_SIZE = int(os.getenv("EMBED_QUEUE_SIZE", "1000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_BATCH_WAIT_MS = int(os.getenv("EMBED_BATCH_WAIT_MS", "25"))
+EMBED_ENQUEUE_TIMEOUT = float(os.getenv("EMBED_ENQUEUE_TIMEOUT", "2"))
+
+_sidecar_client = None
+_backend = None
+
+def get_backend():
+    """Construct the EMBEDDING_BACKEND encoder on first use (torch/onnxruntime are imported here, not at startup)"""
+    global _backend
+    if _backend is None:
+        started = time.perf_counter()
+        _backend = get_embedding_backend()
+        print(f"[Vector DB] Loaded {_backend.name} embedding backend in {time.perf_counter() - started:.2f}s")
+    return _backend
+
+def _embed_via_sidecar(texts: list) -> list:
+    global _sidecar_client
+    if _sidecar_client is None:
+        _sidecar_client = httpx.Client(base_url=EMBEDDING_SIDECAR_URL, timeout=EMBEDDING_SIDECAR_TIMEOUT)
+    response = _sidecar_client.post("/embed", json={"texts": texts})
+    response.raise_for_status()
+    return response.json()["embeddings"]
 
 def embed_text(text: str):
-    return model.encode(text).tolist()
+    return embed_texts([text])[0]
+
+def embed_texts(texts: list) -> list:
+    if EMBEDDING_SIDECAR_URL:
+        return _embed_via_sidecar(texts)
+    return get_backend().encode(texts).tolist()
+
+def warm_up_embeddings():
+    """Load the model (or reach the sidecar) and run one encode so the first chat turn is not cold"""
+    started = time.perf_counter()
+    embed_text("warm up")
+    print(f"[Vector DB] Embedding warm-up finished in {time.perf_counter() - started:.2f}s")
+
+
+class EmbeddingWorker:
+    """
+    Micro-batches pending chat messages from all requests into one model.encode call
+    and one Mongo bulk write into vector_responses. The queue is bounded: when it is
+    full, producers block for up to EMBED_ENQUEUE_TIMEOUT seconds and then store the
+    item inline.
+    """
+
+    def __init__(self, maxsize: int = EMBED_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+                self._thread.start()
+
+    def submit(self, test_id: str, question_index: int, text: str, vector: Optional[list] = None, turn: Optional[int] = None):
+        self.start()
+        if turn is None:
+            turn = time.time_ns() // 1_000_000  # no conversation position known; millisecond timestamp keeps keys unique
+        item = {"test_id": test_id, "question_index": question_index, "turn": turn, "text": text, "embedding": vector}
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            try:
+                self._queue.put(item, timeout=EMBED_ENQUEUE_TIMEOUT)
+            except queue.Full:
+                print(f"[Vector DB] Queue full, storing inline for test {test_id}")
+                self._process([item])
+
+    def _collect_batch(self) -> list:
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + EMBED_BATCH_WAIT_MS / 1000
+        while len(batch) < EMBED_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            try:
+                self._process(batch)
+            except Exception as e:
+                print(f"[Vector DB] Failed to store batch of {len(batch)}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
 
-def store_vector(test_id: str, question_index: int, vector: list, text: str):
-    store_vector_response(test_id, question_index, vector, text)  #actual storage
-    print(f"[Vector DB] Stored for test {test_id}, Q{question_index}: Text = {text[:30]}..., Embedding Length = {len(vector)}")
+    def _process(self, batch: list):
+        pending = [item for item in batch if item["embedding"] is None]
+        if pending:
+            for item, vector in zip(pending, embed_texts([item["text"] for item in pending])):
+                item["embedding"] = vector
+        store_vector_responses_bulk(batch)
+        print(f"[Vector DB] Stored batch of {len(batch)} ({len(pending)} embedded)")
 
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until everything queued so far has been written"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
 
-# store in mogodb??
+    def stop(self, timeout: float = 30.0):
+        flushed = self.flush(timeout)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if not flushed:
+            print(f"[Vector DB] Shutdown with {self._queue.qsize()} embeddings still queued")
 
-'''
 
-append in mongo_handler
-def store_vector_response(test_id, question_index, vector, text):
-    collection.update_one(
-        {"test_id": test_id},
-        {
-            "$push": {
-                "vector_responses": {
-                    "question_index": question_index,
-                    "text": text,
-                    "embedding": vector
-                }
-            }
-        }
-    )
+embedding_worker = EmbeddingWorker()
 
-    
-in chat, in respond add:
-from db.vector_store import embed_text, store_vector
+def start_embedding_worker():
+    embedding_worker.start()
 
-# Inside the try block
-user_text = req.chat_history[-1]["content"] if req.chat_history else ""
-vector = embed_text(user_text)
-store_vector(test_id="unknown", question_index=question_index, vector=vector, text=user_text)
+def stop_embedding_worker():
+    embedding_worker.stop()
 
-    
+def store_vector(test_id: str, question_index: int, vector: Optional[list], text: str, turn: Optional[int] = None):
+    """Queue a message for storage; the worker embeds it if no vector is given"""
+    embedding_worker.submit(test_id, question_index, text, vector, turn)
 
-'''
\ No newline at end of file
+def store_turn_vector(turn):
+    """Store a TurnContext's message, reusing its embedding if the request already computed it"""
+    vector = turn.embedding if turn.has_embedding() else None
+    store_vector(turn.test_id, max(0, turn.question_index), vector, turn.text, turn.turn_index)
@@ -1,8 +1,43 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from backend_api import chat, review, auth, test, child  # ← Added test and child imports
+from backend_api import chat, review, auth, test, child, metrics  # ← Added test and child imports
+from services.llm_chat import close_llm_clients
+from db.vector_store import start_embedding_worker, stop_embedding_worker, warm_up_embeddings, EMBEDDING_WARMUP
+from utils.intent_classifier import warm_up_intent_centroids
+from db.mongo_handler import db
+from db.indexes import ensure_indexes, MONGO_ENSURE_INDEXES
+from db.job_queue import start_job_worker, stop_job_worker
+from db.async_repository import close_async_mongo
+from db.child_cache import start_child_cache_sync, stop_child_cache_sync
+from services.speculation import cancel_all_speculation
 
-app = FastAPI()
+def warm_up():
+    warm_up_embeddings()
+    warm_up_intent_centroids()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MONGO_ENSURE_INDEXES:
+        await asyncio.to_thread(ensure_indexes, db)
+    start_embedding_worker()
+    start_job_worker()
+    start_child_cache_sync()
+    if EMBEDDING_WARMUP:
+        # Warm in the background so /auth/login is served immediately
+        threading.Thread(target=warm_up, name="embedding-warmup", daemon=True).start()
+    yield
+    # Flush queued embeddings, stop claiming jobs and cache sync, and release pooled LLM/Mongo connections on shutdown
+    cancel_all_speculation()
+    stop_job_worker()
+    stop_child_cache_sync()
+    stop_embedding_worker()
+    await close_llm_clients()
+    await close_async_mongo()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",  # your frontend
@@ -14,10 +49,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # or specify ["GET", "POST", "OPTIONS"]
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # review list pagination cursor
 )
 
 app.include_router(chat.router, prefix="/chat")
 app.include_router(review.router)
 app.include_router(auth.router, prefix="")
 app.include_router(test.router, prefix="")  # ← Added test router registration
-app.include_router(child.router, prefix="")  # ← Added child router registration
\ No newline at end of file
+app.include_router(child.router, prefix="")  # ← Added child router registration
+app.include_router(metrics.router)
\ No newline at end of file
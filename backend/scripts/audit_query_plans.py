@@ -0,0 +1,61 @@
+# scripts/audit_query_plans.py
+#
+# Dev-mode query-plan audit: explain()s the queries behind each request path against a
+# local mongod and flags any that fall back to a collection scan. Exits non-zero if any do.
+# Run from backend/:  python -m scripts.audit_query_plans [--ensure-indexes]
+#
+# For queries issued at runtime, MONGO_AUDIT_PLANS=1 makes the accessor layer explain each
+# new query shape and log COLLSCANs while you click through the app.
+
+import sys
+from db.mongo_handler import db
+from db.indexes import ensure_indexes, index_drift, explain_find
+
+def sample(collection, field, default):
+    doc = db[collection].find_one({field: {"$exists": True}}, {field: 1})
+    return doc[field] if doc else default
+
+def request_path_queries():
+    test_id = sample("tests", "test_id", "audit-test")
+    child_id = sample("tests", "child_id", "audit-child")
+    email = sample("tests", "email", "audit@example.com")
+    code = sample("children", "code", "AUDIT123")
+    return [
+        ("POST /chat/respond (submitted check)", "tests", {"test_id": test_id}, None),
+        ("POST /chat/start (resume lookup)", "tests",
+         {"child_id": child_id, "respondent_type": "parent", "email": email, "submitted": False}, None),
+        ("POST /chat/start (child code)", "children", {"code": code}, None),
+        ("GET /child/{child_id}", "children", {"child_id": child_id}, None),
+        ("POST /auth/login", "users", {"email": email}, None),
+        ("GET /test/summary", "tests", {"email": email, "respondent_type": "parent"}, [("_id", 1)]),
+        ("GET /test/results/{child_id}", "tests", {"child_id": child_id, "email": email, "respondent_type": "parent"}, None),
+        ("POST /test/submit (all submitted)", "tests", {"child_id": child_id, "submitted": True}, None),
+        ("GET /score/by-child/{child_id}", "tests", {"child_id": child_id, "submitted": True, "scores": {"$ne": None}}, None),
+        ("GET /test/status/{child_id}", "reviews", {"child_id": child_id}, None),
+        ("GET /reviews/pending", "reviews", {"status": "pending"}, [("_id", 1)]),
+        ("GET /reviews/completed", "reviews", {"status": "reviewed"}, [("_id", 1)]),
+        ("GET /reviews/{child_id} (chat turns)", "vector_responses", {"test_id": test_id, "turn": {"$exists": True}},
+         [("question_index", 1), ("turn", 1)]),
+    ]
+
+def main(ensure=False):
+    if ensure:
+        ensure_indexes(db)
+    drift = index_drift(db)
+    if drift:
+        print("Index drift:")
+        for collection, entry in drift.items():
+            print(f"  {collection}: {entry}")
+
+    scans = 0
+    for label, collection, query, sort in request_path_queries():
+        stages = explain_find(db[collection], query, sort)
+        flag = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        scans += flag != "ok"
+        print(f"{flag:<9}{label:<45}{' > '.join(stages)}")
+
+    print(f"\n{scans} request-path queries use a collection scan")
+    return scans
+
+if __name__ == "__main__":
+    sys.exit(1 if main(ensure="--ensure-indexes" in sys.argv[1:]) else 0)
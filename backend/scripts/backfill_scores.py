@@ -0,0 +1,129 @@
+# scripts/backfill_scores.py
+#
+# Rescoring job for when the scoring tables change. Streams submitted tests in _id order,
+# scores a batch per call with the vectorized scorer, writes tests.scores with one bulk
+# write per batch and copies the new scores into the children's reviews.
+#
+# Resumable: the last _id of every finished batch is written to the checkpoint file and
+# --resume continues after it. --dry-run writes nothing and reports the tests whose score
+# would change. --summaries also regenerates the AI summary of pending reviews whose
+# scores changed (one LLM call per child). --export writes every score to CSV.
+#
+# Run from backend/:
+#   python -m scripts.backfill_scores [--dry-run] [--resume] [--summaries] [--export scores.csv]
+#                                     [--checkpoint PATH] [--batch-size N]
+
+import os
+import sys
+import csv
+import time
+from itertools import islice
+from bson import ObjectId
+from db.mongo_handler import tests_collection, store_scores_bulk, refresh_review_scores, refresh_pending_summary
+from db.accessors import TEST_RESCORE
+from core.sdq_scoring import SUBSCALES, score_tests
+
+BATCH_SIZE = 2000
+CHECKPOINT_PATH = ".backfill_scores.checkpoint"
+MAX_DIFF_LINES = 50
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def batches(cursor, size):
+    while True:
+        batch = list(islice(cursor, size))
+        if not batch:
+            return
+        yield batch
+
+def score_changed(old, new):
+    old = old or {}
+    return old.get("total_score") != new["total_score"] or old.get("subscale_scores") != new["subscale_scores"]
+
+def describe_change(old, new):
+    old = old or {}
+    parts = [f"total {old.get('total_score')} -> {new['total_score']}"]
+    old_subscales = old.get("subscale_scores") or {}
+    for name, value in new["subscale_scores"].items():
+        if old_subscales.get(name) != value:
+            parts.append(f"{name} {old_subscales.get(name)} -> {value}")
+    return ", ".join(parts)
+
+def main(dry_run=False, resume=False, summaries=False, export_path=None,
+         checkpoint_path=CHECKPOINT_PATH, batch_size=BATCH_SIZE):
+    query = {"submitted": True, "confirm_options.0": {"$exists": True}}
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            last_id = f.read().strip()
+        query["_id"] = {"$gt": ObjectId(last_id)}
+        print(f"Resuming after {last_id}")
+
+    total = tests_collection.count_documents(query)
+    cursor = tests_collection.find(query, TEST_RESCORE.projection).sort("_id", 1).batch_size(batch_size)
+
+    writer = None
+    if export_path:
+        export_file = open(export_path, "a" if resume else "w", newline="")
+        writer = csv.writer(export_file)
+        if not resume:
+            writer.writerow(["test_id", "child_id", "respondent_type", "total_score", "response_count", *SUBSCALES])
+
+    started = time.perf_counter()
+    scored = changed = 0
+    changed_children = set()
+    for batch in batches(cursor, batch_size):
+        results = score_tests(batch)
+        diffs = [(t, r) for t, r in zip(batch, results) if score_changed(t.get("scores"), r)]
+        changed_children.update(t["child_id"] for t, _ in diffs)
+
+        if dry_run:
+            for test, result in diffs[:max(0, MAX_DIFF_LINES - changed)]:
+                print(f"  {test['test_id']} ({test.get('respondent_type')}): {describe_change(test.get('scores'), result)}")
+        else:
+            # Unchanged scores are rewritten too, so calculated_at reflects this run
+            store_scores_bulk(results)
+            refresh_review_scores(t["child_id"] for t, _ in diffs)
+            with open(checkpoint_path, "w") as f:
+                f.write(str(batch[-1]["_id"]))
+        changed += len(diffs)
+
+        if writer:
+            for test, r in zip(batch, results):
+                writer.writerow([
+                    r["test_id"], test.get("child_id"), test.get("respondent_type"),
+                    r["total_score"], r["response_count"], *r["subscale_scores"].values()
+                ])
+
+        scored += len(results)
+        elapsed = time.perf_counter() - started
+        print(f"... {scored}/{total} tests, {changed} changed, {scored / elapsed:.0f} tests/s")
+
+    if writer:
+        export_file.close()
+        print(f"Exported to {export_path}")
+
+    if summaries and not dry_run:
+        refreshed = sum(1 for child_id in changed_children if refresh_pending_summary(child_id))
+        print(f"Regenerated {refreshed} pending review summaries")
+
+    if not dry_run and os.path.exists(checkpoint_path):
+        # Finished: the next run starts from the beginning
+        os.remove(checkpoint_path)
+
+    elapsed = time.perf_counter() - started
+    if dry_run:
+        print(f"Dry run: {changed} of {scored} tests would change score ({len(changed_children)} children)")
+    else:
+        print(f"Rescored {scored} tests in {elapsed:.1f}s, {changed} changed ({len(changed_children)} children)")
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    main(
+        dry_run="--dry-run" in args,
+        resume="--resume" in args,
+        summaries="--summaries" in args,
+        export_path=option(args, "--export"),
+        checkpoint_path=option(args, "--checkpoint", CHECKPOINT_PATH),
+        batch_size=int(option(args, "--batch-size", BATCH_SIZE))
+    )
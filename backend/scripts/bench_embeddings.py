@@ -0,0 +1,94 @@
+# scripts/bench_embeddings.py
+#
+# Compares the embedding backends on a synthetic corpus of SDQ-style chat answers:
+# single-message latency, batch throughput, and cosine drift against sentence-transformers.
+# Run from backend/:  python -m scripts.bench_embeddings [backend ...]
+
+import sys
+import time
+import itertools
+import numpy as np
+from db.embedding_backends import get_embedding_backend, EMBEDDING_BACKENDS
+
+BASELINE = "sentence-transformers"
+
+SUBJECTS = ["He", "She", "They", "My son", "My daughter", "Our kid", "The student"]
+BEHAVIOURS = [
+    "gets upset when plans change",
+    "plays alone at recess",
+    "shares snacks with friends",
+    "has trouble sitting still during dinner",
+    "complains about stomach aches before school",
+    "fights with his brother over toys",
+    "helps younger kids on the playground",
+    "loses focus halfway through homework",
+    "worries a lot about tests",
+    "lies about finishing chores",
+]
+FREQUENCIES = ["never", "rarely", "sometimes", "now and then", "often", "almost always", "every single day"]
+ANSWERS = [
+    "Not True", "Somewhat True", "Certainly True", "yes", "yeah that's right",
+    "what does that mean?", "no, more than that", "not really", "I'm not sure",
+]
+
+
+def build_corpus(limit: int = 600) -> list:
+    stories = [
+        f"{s} {f} {b}."
+        for s, f, b in itertools.product(SUBJECTS, FREQUENCIES, BEHAVIOURS)
+    ]
+    corpus = ANSWERS + stories
+    return corpus[:limit]
+
+
+def percentile(samples: list, p: float) -> float:
+    return float(np.percentile(np.array(samples), p))
+
+
+def bench(name: str, corpus: list, baseline: np.ndarray = None) -> dict:
+    started = time.perf_counter()
+    backend = get_embedding_backend(name)
+    backend.encode(["warm up"])
+    load_seconds = time.perf_counter() - started
+
+    latencies = []
+    for text in corpus[:200]:
+        t = time.perf_counter()
+        backend.encode([text])
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    t = time.perf_counter()
+    vectors = np.asarray(backend.encode(corpus), dtype=np.float32)
+    throughput = len(corpus) / (time.perf_counter() - t)
+
+    result = {
+        "backend": name,
+        "load_s": load_seconds,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "texts_per_s": throughput,
+        "vectors": vectors,
+    }
+    if baseline is not None:
+        a = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        b = baseline / np.linalg.norm(baseline, axis=1, keepdims=True)
+        cosine = (a * b).sum(axis=1)
+        result["cos_mean"] = float(cosine.mean())
+        result["cos_min"] = float(cosine.min())
+    return result
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(EMBEDDING_BACKENDS)
+    corpus = build_corpus()
+    print(f"Corpus: {len(corpus)} SDQ-style answers")
+
+    baseline = bench(BASELINE, corpus)
+    results = [baseline] + [bench(n, corpus, baseline["vectors"]) for n in names if n != BASELINE]
+
+    print(f"{'backend':<24}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'texts/s':>10}{'cos mean':>10}{'cos min':>10}")
+    for r in results:
+        print(
+            f"{r['backend']:<24}{r['load_s']:>8.2f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['texts_per_s']:>10.0f}"
+            f"{r.get('cos_mean', 1.0):>10.4f}{r.get('cos_min', 1.0):>10.4f}"
+        )
@@ -0,0 +1,45 @@
+# scripts/bench_question_rendering.py
+#
+# Micro-benchmark for question rendering: the precompiled templates versus the reference
+# startswith()/lower() chain, over every question/respondent combination of each age band
+# (25 questions x parent/teacher/child = 75 per band). Also checks both produce identical text.
+# Run from backend/:  python -m scripts.bench_question_rendering [iterations]
+
+import sys
+import timeit
+from core.prompt_builder import (
+    QUESTIONS_2_TO_4, QUESTIONS_4_TO_10, QUESTIONS_11_TO_17,
+    build_question_prompt, _render_question_prompt
+)
+
+BANDS = {"2-4": QUESTIONS_2_TO_4, "4-10": QUESTIONS_4_TO_10, "11-17": QUESTIONS_11_TO_17}
+RESPONDENT_TYPES = ["parent", "teacher", "child"]
+NAME = "Sam"
+
+
+def combinations(bank):
+    return [(q, r) for q in bank for r in RESPONDENT_TYPES]
+
+
+def render_all(render, combos):
+    for question, respondent_type in combos:
+        render(question, NAME, respondent_type)
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print(f"{'band':<8}{'combos':>8}{'reference us':>15}{'compiled us':>14}{'speedup':>9}")
+    for band, bank in BANDS.items():
+        combos = combinations(bank)
+        mismatched = [c for c in combos if build_question_prompt(c[0], NAME, c[1]) != _render_question_prompt(c[0], NAME, c[1])]
+        if mismatched:
+            print(f"Template output differs from reference for {mismatched}")
+            sys.exit(1)
+
+        reference = timeit.timeit(lambda: render_all(_render_question_prompt, combos), number=iterations)
+        compiled = timeit.timeit(lambda: render_all(build_question_prompt, combos), number=iterations)
+        # Per full pass over the band, in microseconds
+        ref_us = reference / iterations * 1e6
+        comp_us = compiled / iterations * 1e6
+        print(f"{band:<8}{len(combos):>8}{ref_us:>15.1f}{comp_us:>14.1f}{ref_us / comp_us:>8.1f}x")
@@ -0,0 +1,57 @@
+# scripts/check_intent_rules.py
+#
+# Sanity check for the tier 1 intent rules (utils/intent_classifier.py): real sample messages
+# per rule, plus sharing-experience messages that mention the rule's keywords and must fall
+# through to the embedding/LLM tiers (None). Run after editing INTENT_RULES.
+# Run from backend/:  python -m scripts.check_intent_rules
+
+import sys
+from utils.intent_classifier import classify_by_rules, normalize_message
+
+SAMPLES = {
+    "direct_answer": [
+        "Not true", "Somewhat true.", "certainly true!", "I'd say somewhat true",
+        "Definitely certainly true", "'Not true'", "No, not true", "Nope, somewhat true",
+    ],
+    "confirmation": [
+        "Yes", "Yes, that's right", "Correct.", "That sounds good", "Yes, correct",
+    ],
+    "correction": [
+        "No, it happens more at school", "Actually it's more often than that",
+        "Not really, only with his cousins", "That's not right", "I don't think that fits her",
+    ],
+    "confused": [
+        "What does that mean?", "What do you mean", "I don't understand the question",
+        "I'm a bit confused", "Sorry, I'm confused", "Can you explain that?", "Explain please",
+        "I'm not sure what you mean", "That's confusing", "What's the meaning of considerate?",
+    ],
+    "asking_question": [
+        "Does this include at home?", "Should I count what happens at school?",
+        "Is this about the last six months?",
+    ],
+    None: [
+        "She gets confused when plans change",
+        "He never lets me explain it to his teacher",
+        "I don't understand why he hits his sister",
+        "Last week he got really upset when his brother took his toy",
+    ],
+}
+
+
+def check() -> list:
+    failures = []
+    for expected, messages in SAMPLES.items():
+        for message in messages:
+            got = classify_by_rules(normalize_message(message))
+            if got != expected:
+                failures.append(f"{message!r}: expected {expected}, got {got}")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check()
+    for failure in failures:
+        print(failure)
+    total = sum(len(m) for m in SAMPLES.values())
+    print(f"{total - len(failures)}/{total} samples classified as expected")
+    sys.exit(1 if failures else 0)
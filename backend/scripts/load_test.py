@@ -0,0 +1,65 @@
+# scripts/load_test.py
+#
+# Closed-loop load test against a running API: N concurrent clients hammer one endpoint
+# for a fixed duration, reporting throughput and latency percentiles per concurrency level.
+# Run the same sweep against a build before and after a change to compare, e.g.
+#   uvicorn main:app --workers 1 &
+#   python -m scripts.load_test --url http://localhost:8000 --child-id <id> --concurrency 1,8,32,128
+#
+# Endpoints exercised (all read-only): GET /child/{child_id}, GET /test/status/{child_id},
+# GET /reviews/pending?limit=20.
+
+import sys
+import time
+import asyncio
+import httpx
+import numpy as np
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+async def client_loop(client, paths, deadline, latencies, errors):
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+async def run_level(base_url, paths, concurrency, duration):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client_loop(client, paths, deadline, latencies, errors) for _ in range(concurrency)))
+    samples = np.array(latencies) if latencies else np.array([0.0])
+    return {
+        "concurrency": concurrency,
+        "rps": len(latencies) / duration,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "errors": len(errors),
+    }
+
+async def main(args):
+    base_url = option(args, "--url", "http://localhost:8000")
+    child_id = option(args, "--child-id", "load-test-child")
+    duration = float(option(args, "--duration", "10"))
+    levels = [int(c) for c in option(args, "--concurrency", "1,8,32,128").split(",")]
+    paths = [f"/child/{child_id}", f"/test/status/{child_id}", "/reviews/pending?limit=20"]
+
+    print(f"{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for concurrency in levels:
+        r = await run_level(base_url, paths, concurrency, duration)
+        print(f"{r['concurrency']:>8}{r['rps']:>10.0f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>8}")
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,53 @@
+# scripts/measure_startup.py
+#
+# Measures per-worker cold start: wall time to import the FastAPI app and peak RSS.
+# Run from backend/:  python -m scripts.measure_startup
+#
+#   lazy    - import main only (what a worker pays before serving /auth/login)
+#   eager   - import main and embed one message in-process (the old import-time cost)
+#   sidecar - same, with EMBEDDING_SIDECAR_URL set (the sidecar must be running;
+#             workers never load torch)
+
+import os
+import sys
+import json
+import subprocess
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+if sys.argv[1] in ("eager", "sidecar"):
+    from db.vector_store import embed_text
+    embed_text("first chat message")
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "rss_mb": rss_kb / 1024, "torch_loaded": "torch" in sys.modules}))
+"""
+
+def measure(mode: str, runs: int = 3) -> dict:
+    env = dict(os.environ)
+    if mode == "sidecar":
+        env["EMBEDDING_SIDECAR_URL"] = env.get("EMBEDDING_SIDECAR_URL", "http://127.0.0.1:8100")
+    else:
+        env.pop("EMBEDDING_SIDECAR_URL", None)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE, mode],
+            env=env, capture_output=True, text=True, check=True
+        )
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "mode": mode,
+        "seconds": min(s["seconds"] for s in samples),
+        "rss_mb": max(s["rss_mb"] for s in samples),
+        "torch_loaded": samples[-1]["torch_loaded"]
+    }
+
+if __name__ == "__main__":
+    modes = sys.argv[1:] or ["eager", "lazy", "sidecar"]
+    print(f"{'mode':<10}{'startup (s)':>14}{'peak RSS (MB)':>16}{'torch':>8}")
+    for mode in modes:
+        r = measure(mode)
+        print(f"{r['mode']:<10}{r['seconds']:>14.2f}{r['rss_mb']:>16.1f}{str(r['torch_loaded']):>8}")
@@ -0,0 +1,61 @@
+# scripts/migrate_vector_responses.py
+#
+# One-off migration: moves the embedding arrays that older builds pushed into
+# tests.vector_responses into the compact vector_responses collection, then unsets the array.
+# Safe to re-run (writes are keyed by test_id/question_index/turn).
+# Run from backend/:  python -m scripts.migrate_vector_responses [--dry-run]
+
+import sys
+from pymongo import UpdateOne
+from db.mongo_handler import tests_collection, vector_responses_collection, vector_response_doc
+
+BATCH_SIZE = 200
+
+def migrate_test(test):
+    """
+    Build the vector_responses upserts for one test. Legacy entries get negative turns
+    (-n .. -1, in array order), disjoint from the session versions the app uses as turns,
+    so they never collide with messages stored at runtime and still sort in conversation order.
+    Entries without an embedding keep their text (embedding None).
+    """
+    ops = []
+    entries = test.get("vector_responses", [])
+    for position, entry in enumerate(entries):
+        q_index = entry.get("question_index", 0)
+        turn = position - len(entries)
+        doc = vector_response_doc(test["test_id"], q_index, turn, entry.get("text", ""), entry.get("embedding"))
+        doc["legacy"] = True
+        ops.append(UpdateOne(
+            {"test_id": doc["test_id"], "question_index": q_index, "turn": turn},
+            {"$setOnInsert": doc},
+            upsert=True
+        ))
+    return ops
+
+def main(dry_run=False):
+    cursor = tests_collection.find(
+        {"vector_responses.0": {"$exists": True}},
+        {"test_id": 1, "vector_responses": 1}
+    ).batch_size(BATCH_SIZE)
+
+    migrated_tests = migrated_vectors = 0
+    for test in cursor:
+        ops = migrate_test(test)
+        if not dry_run:
+            if ops:
+                vector_responses_collection.bulk_write(ops, ordered=False)
+            tests_collection.update_one({"_id": test["_id"]}, {"$unset": {"vector_responses": ""}})
+        migrated_tests += 1
+        migrated_vectors += len(ops)
+        if migrated_tests % 100 == 0:
+            print(f"... {migrated_tests} tests, {migrated_vectors} messages")
+
+    # Empty arrays left behind by create_test_entry in older builds
+    if not dry_run:
+        tests_collection.update_many({"vector_responses": {"$size": 0}}, {"$unset": {"vector_responses": ""}})
+
+    action = "Would migrate" if dry_run else "Migrated"
+    print(f"{action} {migrated_vectors} chat messages from {migrated_tests} tests")
+
+if __name__ == "__main__":
+    main(dry_run="--dry-run" in sys.argv[1:])
@@ -0,0 +1,50 @@
+# scripts/prewarm_llm_cache.py
+#
+# Fills the LLM response cache with the explanation for every question in the three
+# SDQ banks, for both the parent/teacher and the child wording, so no confused
+# respondent waits on a live model call. Already-cached prompts are skipped.
+# Run from backend/:  python -m scripts.prewarm_llm_cache [--force]
+
+import sys
+import asyncio
+from core.prompt_builder import QUESTIONS_2_TO_4, QUESTIONS_4_TO_10, QUESTIONS_11_TO_17, build_explanation_template
+from services.llm_cache import lookup, store, cached_query
+from services.llm_chat import close_llm_clients
+from services.llm_dispatcher import query_llm
+
+RESPONDENT_TYPES = ["parent", "teacher", "child"]
+
+def explanation_prompts():
+    """Distinct templated prompts (banks share most questions; parent and teacher share wording)"""
+    prompts = {}
+    for bank in (QUESTIONS_2_TO_4, QUESTIONS_4_TO_10, QUESTIONS_11_TO_17):
+        for question in bank:
+            for respondent_type in RESPONDENT_TYPES:
+                prompts.setdefault(build_explanation_template(question, respondent_type), question)
+    return prompts
+
+async def warm(prompt: str, force: bool) -> bool:
+    if force:
+        store(prompt, await query_llm(prompt))
+        return True
+    if lookup(prompt) is not None:
+        return False
+    await cached_query(prompt)
+    return True
+
+async def main(force: bool = False):
+    prompts = explanation_prompts()
+    print(f"{len(prompts)} distinct explanation prompts")
+    # Concurrency is bounded by LLM_MAX_CONCURRENCY inside the LLM client
+    results = await asyncio.gather(*(warm(p, force) for p in prompts), return_exceptions=True)
+    await close_llm_clients()
+
+    failed = [(prompts[p], r) for p, r in zip(prompts, results) if isinstance(r, Exception)]
+    generated = sum(1 for r in results if r is True)
+    print(f"Generated {generated}, already cached {len(results) - generated - len(failed)}, failed {len(failed)}")
+    for question, error in failed:
+        print(f"  {question}: {error}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(force="--force" in sys.argv[1:])))
@@ -0,0 +1,28 @@
+# scripts/run_jobs.py
+#
+# Standalone job worker for the Mongo-backed queue (scoring and review summaries), for
+# deployments that run the API with JOB_WORKER_ENABLED=0 and process jobs separately.
+# Run from backend/:  python -m scripts.run_jobs [--once] [--retry-failed KEY ...]
+
+import sys
+import time
+from db.job_queue import run_pending, retry_failed, job_worker, JOB_POLL_INTERVAL
+import services.submission_jobs  # registers the job handlers
+
+def main(args):
+    if "--retry-failed" in args:
+        for key in args[args.index("--retry-failed") + 1:]:
+            print(f"{key}: {'requeued' if retry_failed(key) else 'not a failed job'}")
+        return
+
+    if "--once" in args:
+        print(f"Ran {run_pending(job_worker.worker_id)} jobs")
+        return
+
+    print(f"Job worker {job_worker.worker_id} polling every {JOB_POLL_INTERVAL}s")
+    while True:
+        if not run_pending(job_worker.worker_id):
+            time.sleep(JOB_POLL_INTERVAL)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,115 @@
+# services/llm_cache.py
+#
+# Content-addressed cache for deterministic prompts (e.g. question explanations).
+# Two tiers: a per-process LRU with TTL in front of the llm_cache Mongo collection, which
+# survives restarts and is shared by every worker (Mongo expires entries via a TTL index).
+# Prompts are cached in templated form: personal values such as the child's name are left
+# as placeholders and substituted into the reply, so one entry serves every child.
+
+import os
+import asyncio
+import hashlib
+from datetime import datetime
+from typing import Dict, Optional
+from utils.lru_cache import LRUCache
+from services.llm_chat import llm_model_id
+from services.llm_dispatcher import query_llm, stream_llm
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1000"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "1") == "1"
+
+_responses = LRUCache(maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+
+
+def cache_key(prompt: str) -> str:
+    """Replies depend on the model as well as the prompt"""
+    return hashlib.sha256(f"{llm_model_id()}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def _collection():
+    # Imported lazily so scripts and the sidecar can use this module without a Mongo connection
+    from db.mongo_handler import llm_cache_collection
+    return llm_cache_collection
+
+
+def lookup(prompt: str) -> Optional[str]:
+    key = cache_key(prompt)
+    text = _responses.get(key)
+    if text is None and LLM_CACHE_PERSIST:
+        doc = _collection().find_one({"key": key}, {"_id": 0, "response": 1})
+        if doc:
+            text = doc["response"]
+            _responses.set(key, text)
+    return text
+
+
+def store(prompt: str, text: str):
+    key = cache_key(prompt)
+    _responses.set(key, text)
+    if LLM_CACHE_PERSIST:
+        _collection().update_one(
+            {"key": key},
+            {"$set": {"response": text, "prompt": prompt, "model": llm_model_id(),
+                      "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+
+def render(text: str, substitutions: Optional[Dict[str, str]] = None) -> str:
+    for placeholder, value in (substitutions or {}).items():
+        text = text.replace(placeholder, value)
+    return text
+
+
+def _partial_placeholder(text: str, substitutions: Dict[str, str]) -> int:
+    """Length of the tail of `text` that could be the start of a placeholder split across chunks"""
+    longest = 0
+    for placeholder in substitutions:
+        for n in range(min(len(placeholder) - 1, len(text)), longest, -1):
+            if placeholder.startswith(text[-n:]):
+                longest = n
+                break
+    return longest
+
+
+async def _stream_rendered(prompt: str, substitutions: Dict[str, str], stream: asyncio.Queue) -> str:
+    """Forward chunks as they arrive, holding back any tail that may be half a placeholder"""
+    chunks, pending = [], ""
+    async for chunk in stream_llm(prompt):
+        chunks.append(chunk)
+        pending = render(pending + chunk, substitutions)
+        hold = _partial_placeholder(pending, substitutions)
+        ready, pending = pending[:len(pending) - hold], pending[len(pending) - hold:]
+        if ready:
+            await stream.put(ready)
+    if pending:
+        await stream.put(pending)
+    return "".join(chunks)
+
+
+async def cached_query(prompt: str, substitutions: Optional[Dict[str, str]] = None,
+                       stream: Optional[asyncio.Queue] = None) -> str:
+    """
+    LLM reply for a templated prompt, from cache when possible.
+    The cached text keeps its placeholders; `substitutions` are applied to what is returned
+    (and streamed, when a queue is given).
+    """
+    substitutions = substitutions or {}
+    text = await asyncio.to_thread(lookup, prompt)
+    if text is not None:
+        rendered = render(text, substitutions)
+        if stream is not None:
+            await stream.put(rendered)
+        return rendered
+
+    if stream is None:
+        text = await query_llm(prompt)
+    else:
+        text = await _stream_rendered(prompt, substitutions, stream)
+    await asyncio.to_thread(store, prompt, text)
+    return render(text, substitutions)
+
+
+def llm_cache_stats() -> dict:
+    return _responses.stats()
@@ -1,7 +1,10 @@
 # services/llm_chat.py
 
 import os
-import requests
+import json
+import asyncio
+import httpx
+from typing import AsyncIterator
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -10,16 +13,116 @@ LLM_BACKEND = os.getenv("LLM_BACKEND")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
-def query_llm(prompt: str) -> str:
-    if LLM_BACKEND == "gemini":
-        return query_gemini(prompt)
-    elif LLM_BACKEND == "qwen":
-        return query_qwen(prompt)
+# Local OpenAI-compatible server (llama.cpp server, vLLM, ...) for LLM_BACKEND=qwen
+QWEN_BASE_URL = os.getenv("QWEN_BASE_URL", "http://localhost:8080/v1").rstrip("/")
+QWEN_MODEL = os.getenv("QWEN_MODEL", "qwen2.5-7b-instruct")
+QWEN_API_KEY = os.getenv("QWEN_API_KEY", "")
+QWEN_MAX_TOKENS = int(os.getenv("QWEN_MAX_TOKENS", "512"))
+QWEN_TEMPERATURE = float(os.getenv("QWEN_TEMPERATURE", "0.2"))
+# Coalesce prompts arriving within this window into one /completions call with a prompt
+# list (0 = send every prompt as its own /chat/completions request and let the server's
+# continuous batching interleave them)
+QWEN_BATCH_WINDOW_MS = float(os.getenv("QWEN_BATCH_WINDOW_MS", "0"))
+QWEN_MAX_BATCH = int(os.getenv("QWEN_MAX_BATCH", "16"))
+# /completions takes raw text, so batched prompts are wrapped in the model's chat template
+# here (what /chat/completions does server-side). The default is Qwen2.5's ChatML with its
+# default system message, which keeps batched and unbatched replies alike and lets batched
+# prompts reuse the prefixes warm_prefix warms. Set it empty only for base-model endpoints.
+QWEN_CHAT_TEMPLATE = os.getenv(
+    "QWEN_CHAT_TEMPLATE",
+    "<|im_start|>system\nYou are Qwen, created by Alibaba Cloud. You are a helpful assistant.<|im_end|>\n"
+    "<|im_start|>user\n{prompt}<|im_end|>\n<|im_start|>assistant\n"
+)
+QWEN_CHAT_STOP = [s for s in os.getenv("QWEN_CHAT_STOP", "<|im_end|>").split(",") if s]
+
+# HTTP client tuning (seconds / connection counts)
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+_timeout = httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+_limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_KEEPALIVE)
+
+_async_client = None
+_sync_client = None
+_semaphore = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for async callers (created on first use)"""
+    global _async_client, _semaphore
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(timeout=_timeout, limits=_limits)
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _async_client
+
+
+def get_sync_client() -> httpx.Client:
+    """Shared keep-alive client for sync callers (summary generation, scripts)"""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(timeout=_timeout, limits=_limits)
+    return _sync_client
+
+
+async def close_llm_clients():
+    """Release pooled connections; called from the app shutdown hook"""
+    global _async_client, _sync_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+def llm_model_id() -> str:
+    """Identifies whatever produces the replies (used to key cached responses)"""
+    model = QWEN_MODEL if LLM_BACKEND == "qwen" else GEMINI_MODEL
+    return f"{LLM_BACKEND}:{model}"
+
+
+# Single-backend calls. Application code goes through services/llm_dispatcher.py
+# (query_llm / stream_llm / query_llm_sync), which adds deadlines, hedging and fallbacks.
+async def query_backend(prompt: str, backend: str = None) -> str:
+    backend = backend or LLM_BACKEND
+    if backend == "gemini":
+        return await query_gemini(prompt)
+    elif backend == "qwen":
+        return await query_qwen(prompt)
+    else:
+        raise ValueError(f"Unsupported LLM_BACKEND: {backend}")
+
+
+async def stream_backend(prompt: str, backend: str = None) -> AsyncIterator[str]:
+    """Yield the reply in chunks as the backend produces them"""
+    backend = backend or LLM_BACKEND
+    if backend == "gemini":
+        async for chunk in stream_gemini(prompt):
+            yield chunk
+    elif backend == "qwen":
+        async for chunk in stream_qwen(prompt):
+            yield chunk
     else:
-        raise ValueError(f"Unsupported LLM_BACKEND: {LLM_BACKEND}")
+        # Backends without streaming support produce one chunk
+        yield await query_backend(prompt, backend)
 
-def query_gemini(prompt: str) -> str:
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
+
+def query_backend_sync(prompt: str, backend: str = None, timeout: float = None) -> str:
+    """Blocking variant of query_backend for code that does not run on the event loop"""
+    backend = backend or LLM_BACKEND
+    if backend == "gemini":
+        return query_gemini_sync(prompt, timeout)
+    elif backend == "qwen":
+        return query_qwen_sync(prompt, timeout)
+    else:
+        raise ValueError(f"Unsupported LLM_BACKEND for sync calls: {backend}")
+
+
+def _gemini_request(prompt: str, method: str = "generateContent"):
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:{method}"
     headers = {
         "Content-Type": "application/json",
         "X-goog-api-key": GEMINI_API_KEY
@@ -31,6 +134,199 @@ def query_gemini(prompt: str) -> str:
             }
         ]
     }
-    response = requests.post(url, headers=headers, json=payload)
+    return url, headers, payload
+
+
+def _gemini_text(data: dict) -> str:
+    return data["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def _gemini_chunk_text(data: dict) -> str:
+    """Streamed chunks may carry no text (e.g. the final one with only finishReason)"""
+    candidates = data.get("candidates") or [{}]
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(p.get("text", "") for p in parts)
+
+
+async def query_gemini(prompt: str) -> str:
+    url, headers, payload = _gemini_request(prompt)
+    client = get_async_client()
+    async with _semaphore:
+        response = await client.post(url, headers=headers, json=payload)
+    response.raise_for_status()
+    return _gemini_text(response.json())
+
+
+def _request_timeout(timeout: float = None):
+    return httpx.USE_CLIENT_DEFAULT if timeout is None else httpx.Timeout(timeout, connect=min(timeout, LLM_CONNECT_TIMEOUT))
+
+
+def query_gemini_sync(prompt: str, timeout: float = None) -> str:
+    url, headers, payload = _gemini_request(prompt)
+    response = get_sync_client().post(url, headers=headers, json=payload, timeout=_request_timeout(timeout))
+    response.raise_for_status()
+    return _gemini_text(response.json())
+
+
+async def stream_gemini(prompt: str) -> AsyncIterator[str]:
+    url, headers, payload = _gemini_request(prompt, "streamGenerateContent")
+    client = get_async_client()
+    async with _semaphore:
+        async with client.stream("POST", url, params={"alt": "sse"}, headers=headers, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                text = _gemini_chunk_text(json.loads(line[5:]))
+                if text:
+                    yield text
+
+
+# ---------------------------- LOCAL OPENAI-COMPATIBLE BACKEND ----------------------------
+def _qwen_headers() -> dict:
+    headers = {"Content-Type": "application/json"}
+    if QWEN_API_KEY:
+        headers["Authorization"] = f"Bearer {QWEN_API_KEY}"
+    return headers
+
+
+def _qwen_chat_payload(prompt: str, stream: bool = False) -> dict:
+    return {
+        "model": QWEN_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": QWEN_MAX_TOKENS,
+        "temperature": QWEN_TEMPERATURE,
+        "stream": stream
+    }
+
+
+async def _qwen_chat(prompt: str) -> str:
+    client = get_async_client()
+    async with _semaphore:
+        response = await client.post(f"{QWEN_BASE_URL}/chat/completions", headers=_qwen_headers(),
+                                     json=_qwen_chat_payload(prompt))
     response.raise_for_status()
-    return response.json()["candidates"][0]["content"]["parts"][0]["text"]
\ No newline at end of file
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def apply_chat_template(prompt: str) -> str:
+    """The text /chat/completions would feed the model for a single user message"""
+    return QWEN_CHAT_TEMPLATE.replace("{prompt}", prompt) if QWEN_CHAT_TEMPLATE else prompt
+
+
+class PromptBatcher:
+    """
+    Collects prompts from concurrent requests for up to QWEN_BATCH_WINDOW_MS and sends
+    them as one /completions call with a prompt list; each caller gets its own choice back.
+    Prompts are wrapped with apply_chat_template, as the unbatched chat path would be.
+    """
+
+    def __init__(self, window_ms: float = QWEN_BATCH_WINDOW_MS, max_batch: int = QWEN_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []
+        self._flush_task = None
+        self._in_flight = set()
+
+    async def submit(self, prompt: str) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((prompt, future))
+        if len(self._pending) >= self.max_batch:
+            if self._flush_task is not None:
+                self._flush_task.cancel()
+                self._flush_task = None
+            self._dispatch()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        self._dispatch()
+
+    def _dispatch(self):
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch):
+        payload = {
+            "model": QWEN_MODEL,
+            "prompt": [apply_chat_template(prompt) for prompt, _ in batch],
+            "max_tokens": QWEN_MAX_TOKENS,
+            "temperature": QWEN_TEMPERATURE
+        }
+        if QWEN_CHAT_TEMPLATE and QWEN_CHAT_STOP:
+            payload["stop"] = QWEN_CHAT_STOP
+        try:
+            client = get_async_client()
+            async with _semaphore:
+                response = await client.post(f"{QWEN_BASE_URL}/completions", headers=_qwen_headers(), json=payload)
+            response.raise_for_status()
+            choices = sorted(response.json()["choices"], key=lambda c: c.get("index", 0))
+            if len(choices) != len(batch):
+                raise ValueError(f"Expected {len(batch)} completions, got {len(choices)}")
+            for (_, future), choice in zip(batch, choices):
+                if not future.done():
+                    future.set_result(choice["text"])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+_batcher = None
+
+
+async def warm_prefix(prefix: str, backend: str = None) -> bool:
+    """
+    Have a local server evaluate `prefix` (one generated token) so its prompt cache holds it
+    when the next prompt starting with it arrives. Hosted backends have nothing to warm.
+    """
+    backend = backend or LLM_BACKEND
+    if backend != "qwen":
+        return False
+    client = get_async_client()
+    payload = _qwen_chat_payload(prefix)
+    payload["max_tokens"] = 1
+    async with _semaphore:
+        response = await client.post(f"{QWEN_BASE_URL}/chat/completions", headers=_qwen_headers(), json=payload)
+    response.raise_for_status()
+    return True
+
+
+async def query_qwen(prompt: str) -> str:
+    global _batcher
+    if QWEN_BATCH_WINDOW_MS <= 0:
+        return await _qwen_chat(prompt)
+    if _batcher is None:
+        _batcher = PromptBatcher()
+    return await _batcher.submit(prompt)
+
+
+def query_qwen_sync(prompt: str, timeout: float = None) -> str:
+    response = get_sync_client().post(f"{QWEN_BASE_URL}/chat/completions", headers=_qwen_headers(),
+                                      json=_qwen_chat_payload(prompt), timeout=_request_timeout(timeout))
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+
+async def stream_qwen(prompt: str) -> AsyncIterator[str]:
+    client = get_async_client()
+    async with _semaphore:
+        async with client.stream("POST", f"{QWEN_BASE_URL}/chat/completions", headers=_qwen_headers(),
+                                 json=_qwen_chat_payload(prompt, stream=True)) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
@@ -0,0 +1,378 @@
+# services/llm_dispatcher.py
+#
+# Resilient front for the single-backend calls in services/llm_chat.py. Every call gets:
+#   deadline   LLM_CALL_DEADLINE_S per call, never more than what is left of the turn budget
+#   hedging    if the primary backend has not answered after its recent latency percentile
+#              (LLM_HEDGE_PERCENTILE), the same prompt is sent to LLM_HEDGE_BACKEND and the
+#              first reply wins; the hedge backend is also the fallback when the primary fails
+#   breaker    a backend failing LLM_BREAKER_FAILURES times in a row is skipped for
+#              LLM_BREAKER_COOLDOWN_S, then given one trial call
+#   budget     inside llm_turn_budget() (one chat turn) all calls share LLM_TURN_DEADLINE_S
+#              and LLM_TURN_MAX_TOKENS (estimated at 4 characters per token)
+# When no backend can answer in time, LLMUnavailable (or LLMBudgetExceeded) is raised and the
+# caller falls back to its local rule path, so a stalled backend costs at most the turn deadline.
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from services.llm_chat import LLM_BACKEND, query_backend, stream_backend, query_backend_sync
+
+LLM_HEDGE_BACKEND = os.getenv("LLM_HEDGE_BACKEND", "")
+LLM_CALL_DEADLINE_S = float(os.getenv("LLM_CALL_DEADLINE_S", "20"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Hedge delay used until enough latencies were observed, and its lower bound afterwards
+LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "3000"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "500"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+LLM_LATENCY_MIN_SAMPLES = int(os.getenv("LLM_LATENCY_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+LLM_TURN_DEADLINE_S = float(os.getenv("LLM_TURN_DEADLINE_S", "25"))
+LLM_TURN_MAX_TOKENS = int(os.getenv("LLM_TURN_MAX_TOKENS", "8000"))
+
+
+class LLMUnavailable(Exception):
+    """No backend produced a reply in time; callers should use their local fallback"""
+
+
+class LLMBudgetExceeded(LLMUnavailable):
+    """The turn's latency or token budget is spent"""
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class BackendHealth:
+    """Rolling latencies and a consecutive-failure circuit breaker for one backend"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "timeouts": 0,
+                         "skipped_open": 0, "hedges_sent": 0, "hedge_wins": 0}
+
+    def allow(self) -> bool:
+        """Closed: always. Open: never until the cooldown passed, then one trial call at a time"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= LLM_BREAKER_COOLDOWN_S and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.counters["skipped_open"] += 1
+            return False
+
+    def started(self):
+        with self._lock:
+            self.counters["calls"] += 1
+
+    def succeeded(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+            self.counters["successes"] += 1
+
+    def failed(self, timeout: bool = False):
+        with self._lock:
+            self._failures += 1
+            self.counters["failures"] += 1
+            if timeout:
+                self.counters["timeouts"] += 1
+            if self._trial_running or self._failures >= LLM_BREAKER_FAILURES:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def abandoned(self):
+        """A hedged call that lost the race; says nothing about the backend's health"""
+        with self._lock:
+            self._trial_running = False
+
+    def count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < LLM_LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def hedge_delay(self) -> float:
+        latency = self.percentile(LLM_HEDGE_PERCENTILE)
+        if latency is None:
+            return LLM_HEDGE_DELAY_MS / 1000
+        return max(LLM_HEDGE_MIN_DELAY_MS / 1000, latency)
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = "closed" if self._opened_at is None else "open"
+            failures = self._failures
+            counters = dict(self.counters)
+        return {
+            "breaker": state,
+            "consecutive_failures": failures,
+            **counters,
+            "latency_p50_s": self.percentile(50),
+            "latency_p95_s": self.percentile(95),
+            "latency_p99_s": self.percentile(99),
+            "hedge_delay_s": self.hedge_delay(),
+        }
+
+
+_health: Dict[str, BackendHealth] = {}
+_health_lock = threading.Lock()
+
+
+def _backend_health(name: str) -> BackendHealth:
+    with _health_lock:
+        if name not in _health:
+            _health[name] = BackendHealth(name)
+        return _health[name]
+
+
+def configured_backends() -> List[str]:
+    backends = [LLM_BACKEND]
+    if LLM_HEDGE_BACKEND and LLM_HEDGE_BACKEND != LLM_BACKEND:
+        backends.append(LLM_HEDGE_BACKEND)
+    return backends
+
+
+# ---------------------------- TURN BUDGET ----------------------------
+class TurnBudget:
+    def __init__(self, deadline_s: float = LLM_TURN_DEADLINE_S, max_tokens: int = LLM_TURN_MAX_TOKENS):
+        self.expires_at = time.monotonic() + deadline_s
+        self.max_tokens = max_tokens
+        self.tokens = 0
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def charge(self, text: str):
+        self.tokens += estimate_tokens(text)
+
+    def check(self, prompt: str):
+        if self.remaining() <= 0:
+            raise LLMBudgetExceeded("Turn latency budget exhausted")
+        if self.tokens + estimate_tokens(prompt) > self.max_tokens:
+            raise LLMBudgetExceeded("Turn token budget exhausted")
+
+
+_turn_budget: contextvars.ContextVar[Optional[TurnBudget]] = contextvars.ContextVar("llm_turn_budget", default=None)
+_stats_lock = threading.Lock()
+_dispatch_stats = {"budget_exceeded": 0, "unavailable": 0}
+
+
+def _count(counter: str):
+    with _stats_lock:
+        _dispatch_stats[counter] += 1
+
+
+@contextmanager
+def llm_turn_budget(deadline_s: float = LLM_TURN_DEADLINE_S, max_tokens: int = LLM_TURN_MAX_TOKENS):
+    """Share one latency/token budget between all LLM calls made inside the block"""
+    token = _turn_budget.set(TurnBudget(deadline_s, max_tokens))
+    try:
+        yield
+    finally:
+        _turn_budget.reset(token)
+
+
+def _call_timeout(prompt: str) -> float:
+    """Deadline for the next call: the per-call deadline, capped by what is left of the turn"""
+    budget = _turn_budget.get()
+    if budget is None:
+        return LLM_CALL_DEADLINE_S
+    try:
+        budget.check(prompt)
+    except LLMBudgetExceeded:
+        _count("budget_exceeded")
+        raise
+    budget.charge(prompt)
+    return min(LLM_CALL_DEADLINE_S, budget.remaining())
+
+
+def _charge_reply(text: str):
+    budget = _turn_budget.get()
+    if budget is not None:
+        budget.charge(text)
+
+
+def _unavailable(message: str) -> LLMUnavailable:
+    _count("unavailable")
+    return LLMUnavailable(message)
+
+
+# ---------------------------- DISPATCH ----------------------------
+async def _timed_query(backend: str, prompt: str) -> str:
+    health = _backend_health(backend)
+    health.started()
+    started = time.monotonic()
+    try:
+        text = await query_backend(prompt, backend)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        health.failed()
+        raise
+    health.succeeded(time.monotonic() - started)
+    return text
+
+
+async def query_llm(prompt: str) -> str:
+    """
+    Reply from the first backend that answers within the deadline.
+    Raises LLMUnavailable when none does, LLMBudgetExceeded when the turn budget is spent.
+    """
+    timeout = _call_timeout(prompt)
+    candidates = configured_backends()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending: Dict[asyncio.Task, str] = {}
+    errors = []
+
+    def launch() -> Optional[str]:
+        # allow() is only asked when the backend is about to be used: for a half-open breaker
+        # it claims the single trial call, which the call's outcome then releases
+        while candidates:
+            backend = candidates.pop(0)
+            if _backend_health(backend).allow():
+                pending[asyncio.create_task(_timed_query(backend, prompt))] = backend
+                return backend
+        return None
+
+    primary = launch()
+    if primary is None:
+        raise _unavailable("All LLM backends are circuit-broken")
+    hedge_at = loop.time() + _backend_health(primary).hedge_delay()
+    try:
+        while pending:
+            now = loop.time()
+            if now >= deadline:
+                break
+            wait = deadline - now
+            if candidates:
+                wait = min(wait, max(0.0, hedge_at - now))
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                backend = pending.pop(task)
+                if task.exception() is None:
+                    if backend != primary:
+                        _backend_health(backend).count("hedge_wins")
+                    text = task.result()
+                    _charge_reply(text)
+                    return text
+                errors.append(f"{backend}: {task.exception()}")
+            if candidates and (not pending or loop.time() >= hedge_at):
+                # Primary is slow (hedge) or already failed (fallback)
+                hedge = launch()
+                if hedge is not None:
+                    _backend_health(hedge).count("hedges_sent")
+    finally:
+        timed_out = loop.time() >= deadline
+        for task, backend in pending.items():
+            task.cancel()
+            if timed_out:
+                _backend_health(backend).failed(timeout=True)
+                errors.append(f"{backend}: no reply within {timeout:.1f}s")
+            else:
+                _backend_health(backend).abandoned()
+
+    raise _unavailable("LLM call failed (" + "; ".join(errors) + ")")
+
+
+async def stream_llm(prompt: str) -> AsyncIterator[str]:
+    """
+    Stream from the first healthy backend, falling back to the next one if it fails before
+    producing anything. Once chunks were sent, a failure raises LLMUnavailable.
+    """
+    timeout = _call_timeout(prompt)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    errors = []
+    for backend in configured_backends():
+        health = _backend_health(backend)
+        if not health.allow():
+            continue
+        health.started()
+        started = time.monotonic()
+        chunks = stream_backend(prompt, backend)
+        produced = []
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                produced.append(chunk)
+                yield chunk
+        except Exception as e:
+            timed_out = isinstance(e, asyncio.TimeoutError)
+            health.failed(timeout=timed_out)
+            errors.append(f"{backend}: {'timed out' if timed_out else e}")
+            if produced:
+                raise _unavailable(f"LLM stream interrupted ({errors[-1]})") from e
+            continue
+        except (asyncio.CancelledError, GeneratorExit):
+            # Consumer went away; release a half-open breaker's trial slot
+            health.abandoned()
+            raise
+        finally:
+            await chunks.aclose()
+        health.succeeded(time.monotonic() - started)
+        _charge_reply("".join(produced))
+        return
+    raise _unavailable("LLM stream failed (" + ("; ".join(errors) or "all backends circuit-broken") + ")")
+
+
+def query_llm_sync(prompt: str) -> str:
+    """
+    Blocking dispatch for background work: backends are tried in order (no hedging), each
+    with the per-call deadline as its HTTP timeout.
+    """
+    timeout = _call_timeout(prompt)
+    errors = []
+    for backend in configured_backends():
+        health = _backend_health(backend)
+        if not health.allow():
+            continue
+        health.started()
+        started = time.monotonic()
+        try:
+            text = query_backend_sync(prompt, backend, timeout=timeout)
+        except Exception as e:
+            health.failed(timeout="timeout" in type(e).__name__.lower())
+            errors.append(f"{backend}: {e}")
+            continue
+        health.succeeded(time.monotonic() - started)
+        _charge_reply(text)
+        return text
+    raise _unavailable("LLM call failed (" + ("; ".join(errors) or "all backends circuit-broken") + ")")
+
+
+def get_llm_stats() -> dict:
+    with _stats_lock:
+        dispatch = dict(_dispatch_stats)
+    return {
+        "backends": {name: _backend_health(name).stats() for name in configured_backends()},
+        "hedge_backend": LLM_HEDGE_BACKEND or None,
+        "call_deadline_s": LLM_CALL_DEADLINE_S,
+        "turn_deadline_s": LLM_TURN_DEADLINE_S,
+        "turn_max_tokens": LLM_TURN_MAX_TOKENS,
+        **dispatch,
+    }
@@ -0,0 +1,81 @@
+# services/speculation.py
+#
+# Background preparation of the next turn while the user reads a newly asked question.
+# Once a question is asked (/chat/confirm-option, a confirmed suggestion, or the start of the
+# test), the likely LLM work of the next turn is started ahead of time:
+#   explanation   the question's templated explanation is fetched into the LLM cache, so a
+#                 "what does that mean?" reply is served without a model call
+#   prefix        local backends evaluate the analysis prompt prefix (system instruction and
+#                 question) so the next analysis call starts from a warm KV cache
+# Rendering the question itself is a table lookup (see core/prompt_builder.py), so nothing
+# needs preparing there. At most one speculation runs per test; it is cancelled when the test
+# moves to another question or is submitted, and gives up after SPECULATION_DEADLINE_S.
+
+import os
+import asyncio
+from typing import Dict
+from core.prompt_builder import (
+    get_questions_for_age, build_analysis_prefix, build_explanation_template
+)
+from services.llm_chat import warm_prefix
+from services.llm_cache import cached_query
+from services.llm_dispatcher import llm_turn_budget
+
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "1") == "1"
+SPECULATION_DEADLINE_S = float(os.getenv("SPECULATION_DEADLINE_S", "30"))
+SPECULATION_MAX_INFLIGHT = int(os.getenv("SPECULATION_MAX_INFLIGHT", "32"))
+
+_tasks: Dict[str, asyncio.Task] = {}
+_stats = {"started": 0, "completed": 0, "cancelled": 0, "failed": 0, "skipped": 0}
+
+
+async def _prepare(age: int, question_index: int, child_name: str, respondent_type: str):
+    question = get_questions_for_age(age)[question_index]
+    # Own budget, so a speculation never spends the budget of the turn that started it
+    with llm_turn_budget(SPECULATION_DEADLINE_S):
+        await asyncio.wait_for(asyncio.gather(
+            cached_query(build_explanation_template(question, respondent_type)),
+            warm_prefix(build_analysis_prefix(age, question_index, child_name, respondent_type)),
+        ), SPECULATION_DEADLINE_S)
+
+
+def _finished(test_id: str, task: asyncio.Task):
+    if _tasks.get(test_id) is task:
+        del _tasks[test_id]
+    if task.cancelled():
+        _stats["cancelled"] += 1
+    elif task.exception() is not None:
+        _stats["failed"] += 1
+        print(f"[Speculation] {test_id}: {task.exception()!r}")
+    else:
+        _stats["completed"] += 1
+
+
+def speculate_next_turn(test_id: str, age: int, question_index: int, child_name: str, respondent_type: str):
+    """Start preparing the turn that answers question `question_index`; must run on the event loop"""
+    if not SPECULATION_ENABLED or not test_id:
+        return
+    cancel_speculation(test_id)
+    if len(_tasks) >= SPECULATION_MAX_INFLIGHT:
+        _stats["skipped"] += 1
+        return
+    task = asyncio.create_task(_prepare(age, question_index, child_name, respondent_type),
+                               name=f"speculate:{test_id}:{question_index}")
+    task.add_done_callback(lambda t: _finished(test_id, t))
+    _tasks[test_id] = task
+    _stats["started"] += 1
+
+
+def cancel_speculation(test_id: str):
+    task = _tasks.pop(test_id, None)
+    if task is not None and not task.done():
+        task.cancel()
+
+
+def cancel_all_speculation():
+    for test_id in list(_tasks):
+        cancel_speculation(test_id)
+
+
+def speculation_stats() -> dict:
+    return {"in_flight": len(_tasks), **_stats}
@@ -0,0 +1,140 @@
+# services/stub_llm_server.py
+#
+# Deterministic stand-in for a local OpenAI-compatible LLM server, for running the app
+# and its load/latency scripts offline. Same prompt in, same reply out:
+#   intent prompts    -> a label picked from keywords in the user's latest message
+#   analysis prompts  -> "... sounds like '<option>'. Does that sound right?"
+#   combined prompts  -> the same label, option and reply as one JSON object
+#   anything else     -> a fixed sentence tagged with a hash of the prompt
+# Optional STUB_LLM_DELAY_MS simulates generation time per request.
+#
+# Run from backend/:  uvicorn services.stub_llm_server:app --port 8080
+# then start the API with LLM_BACKEND=qwen QWEN_BASE_URL=http://localhost:8080/v1
+
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+from typing import List, Optional, Union
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+STUB_LLM_DELAY_MS = float(os.getenv("STUB_LLM_DELAY_MS", "0"))
+
+INTENT_KEYWORDS = [
+    ("confused", r"\b(what do you mean|don't understand|not sure what|confus|explain)\b"),
+    ("confirmation", r"\b(yes|yeah|yep|correct|right|exactly|sure)\b"),
+    ("correction", r"\b(no|not really|actually|but|more like)\b"),
+    ("direct_answer", r"\b(not true|somewhat true|certainly true)\b"),
+    ("asking_question", r"\?$"),
+]
+OPTION_KEYWORDS = [
+    ("Not True", r"\b(never|rarely|hardly|not really|no)\b"),
+    ("Certainly True", r"\b(always|very often|frequently|constantly|every)\b"),
+]
+
+app = FastAPI()
+
+
+class ChatMessage(BaseModel):
+    role: str
+    content: str
+
+
+class ChatRequest(BaseModel):
+    model: Optional[str] = None
+    messages: List[ChatMessage]
+    stream: bool = False
+
+
+class CompletionRequest(BaseModel):
+    model: Optional[str] = None
+    prompt: Union[str, List[str]]
+
+
+def intent_for(message: str) -> str:
+    message = message.strip().lower()
+    for label, pattern in INTENT_KEYWORDS:
+        if re.search(pattern, message):
+            return label
+    return "sharing_experience"
+
+
+def last_user_line(prompt: str) -> str:
+    user_lines = [line for line in prompt.splitlines() if line.startswith("User:")]
+    return user_lines[-1][len("User:"):].lower() if user_lines else ""
+
+
+def option_for(message: str) -> str:
+    return next((o for o, pattern in OPTION_KEYWORDS if re.search(pattern, message)), "Somewhat True")
+
+
+def reply_for(prompt: str) -> str:
+    if "intent classification expert" in prompt:
+        match = re.search(r'User\'s latest message: "(.*)"', prompt)
+        return intent_for(match.group(1) if match else "")
+
+    # core.prompt_builder.TURN_ANALYSIS_MARKER
+    if "Reply with a single JSON object" in prompt:
+        message = last_user_line(prompt)
+        option = option_for(message)
+        return json.dumps({
+            "intent": intent_for(message),
+            "suggested_option": option,
+            "reply": f"Got it – sounds like '{option}'. Does that sound right?"
+        })
+
+    if "Does that sound right?" in prompt:
+        option = option_for(last_user_line(prompt))
+        return f"Got it – sounds like '{option}'. Does that sound right?"
+
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    return f"This is a deterministic stub reply ({digest})."
+
+
+async def simulate_latency():
+    if STUB_LLM_DELAY_MS:
+        await asyncio.sleep(STUB_LLM_DELAY_MS / 1000)
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(req: ChatRequest):
+    await simulate_latency()
+    text = reply_for(req.messages[-1].content if req.messages else "")
+    created = int(time.time())
+
+    if req.stream:
+        async def events():
+            for word in re.findall(r"\S+\s*", text):
+                chunk = {"object": "chat.completion.chunk", "created": created, "model": req.model or "stub",
+                         "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return {
+        "object": "chat.completion",
+        "created": created,
+        "model": req.model or "stub",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]
+    }
+
+
+@app.post("/v1/completions")
+async def completions(req: CompletionRequest):
+    await simulate_latency()
+    prompts = [req.prompt] if isinstance(req.prompt, str) else req.prompt
+    return {
+        "object": "text_completion",
+        "created": int(time.time()),
+        "model": req.model or "stub",
+        "choices": [{"index": i, "text": reply_for(p), "finish_reason": "stop"} for i, p in enumerate(prompts)]
+    }
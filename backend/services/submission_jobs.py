@@ -0,0 +1,48 @@
+# services/submission_jobs.py
+#
+# The slow half of /test/submit, run on the job queue (db/job_queue.py) after the request
+# has returned: score the test, then create/refresh the child's review and its AI summary.
+# Scoring is keyed by test_id, so a resubmitted or double-clicked submit never scores twice.
+# Review summaries are debounced per child: every submission inside the same
+# SUMMARY_DEBOUNCE_SECONDS window maps to one job that runs when the window closes.
+
+import os
+import time
+from datetime import datetime
+from db.job_queue import register_job, enqueue, job_worker
+from db.mongo_handler import generate_score, upsert_review_and_generate_summary
+
+SUMMARY_DEBOUNCE_SECONDS = int(os.getenv("SUMMARY_DEBOUNCE_SECONDS", "60"))
+
+def score_job_key(test_id: str) -> str:
+    return f"score:{test_id}"
+
+def enqueue_submission(test_id: str, child_id: str) -> str:
+    key = enqueue("score_test", {"test_id": test_id, "child_id": child_id}, score_job_key(test_id), child_id)
+    job_worker.notify()
+    return key
+
+def enqueue_review_summary(test_id: str, child_id: str) -> str:
+    """One summary job per child per debounce window, scheduled for the end of the window"""
+    # Epoch seconds; datetime.utcnow().timestamp() would read the naive UTC time as local time
+    now = time.time()
+    window = int(now // SUMMARY_DEBOUNCE_SECONDS) if SUMMARY_DEBOUNCE_SECONDS > 0 else int(now * 1000)
+    run_after = datetime.utcfromtimestamp((window + 1) * SUMMARY_DEBOUNCE_SECONDS) if SUMMARY_DEBOUNCE_SECONDS > 0 else None
+    return enqueue("review_summary", {"test_id": test_id}, f"summary:{child_id}:{window}", child_id, run_after=run_after)
+
+@register_job("score_test")
+def score_test_job(payload: dict) -> dict:
+    test_id, child_id = payload["test_id"], payload["child_id"]
+    try:
+        score_data = generate_score(test_id)
+    finally:
+        # As before, the review goes ahead even when scoring fails; scoring itself is retried,
+        # and a retry that succeeds in a later window queues a fresh summary
+        enqueue_review_summary(test_id, child_id)
+    return {"total_score": score_data["total_score"]}
+
+@register_job("review_summary")
+def review_summary_job(payload: dict) -> dict:
+    # Reads every submitted test of the child, so one run covers all submissions of its window.
+    # When the LLM fails the review keeps a template summary and the job is retried with backoff.
+    return {"review_updated": bool(upsert_review_and_generate_summary(payload["test_id"]))}
@@ -1,7 +1,14 @@
 # core/intent_classifier.py
 
-from services.llm_chat import query_llm
-from typing import List, Dict
+import os
+import re
+import json
+import asyncio
+import threading
+import numpy as np
+from pydantic import BaseModel, ValidationError, model_validator
+from services.llm_dispatcher import query_llm, LLMUnavailable
+from typing import Callable, List, Dict, Literal, Optional, Tuple
 
 INTENT_LABELS = [
     "direct_answer",
@@ -13,24 +20,266 @@ INTENT_LABELS = [
     "unclear"
 ]
 
-def detect_user_intent(chat_history: List[Dict[str, str]]) -> str:
-    """
-    Classifies what the user is doing in the latest message.
-    Returns one of: direct_answer, confirmation, correction, confused, asking_question, sharing_experience, unclear
-    """
-    prompt = build_intent_prompt(chat_history)
-    raw_response = query_llm(prompt).strip().lower()
+# Minimum cosine similarity to the best centroid, and minimum gap to the runner-up,
+# before the embedding tier is trusted over the LLM
+CENTROID_MIN_SIMILARITY = float(os.getenv("INTENT_CENTROID_MIN_SIMILARITY", "0.55"))
+CENTROID_MIN_MARGIN = float(os.getenv("INTENT_CENTROID_MIN_MARGIN", "0.05"))
+# Ask for intent, suggested option and reply in one LLM call when the local tiers are unsure
+COMBINED_TURN_ANALYSIS = os.getenv("COMBINED_TURN_ANALYSIS", "1") == "1"
+
+# Intents whose reply is an LLM analysis of the user's answer
+ANALYSIS_INTENTS = ("correction", "sharing_experience", "unclear")
+
+# --- Tier 1: keyword / regex rules (high precision, short messages only) ---
+_OPTION = r"(not true|somewhat true|certainly true)"
+INTENT_RULES = [
+    ("direct_answer", re.compile(
+        rf"^((no|nope|nah),? )?(i'?d say |i think |i guess |probably |definitely |maybe |it'?s |answer:? )?"
+        rf"'?{_OPTION}'?[.!]*$")),
+    ("confirmation", re.compile(
+        r"^(yes|yeah|yep|yup|sure|ok|okay|correct|right|exactly|agreed|i agree|that'?s right|that'?s correct|"
+        r"that'?s it|sounds (right|good)|that sounds (right|good)|yes,? that'?s right|yes,? correct)[.! ]*$")),
+    ("correction", re.compile(
+        r"^(no|nope|nah|not really|actually|but|hmm,? no|that'?s (not right|wrong|not it)|i disagree|"
+        r"i don'?t (think|agree))\b")),
+    # Anchored: "she gets confused when..." or "...lets me explain it to..." describe the child
+    ("confused", re.compile(
+        r"^(sorry,? |um,? |hmm,? )?(what does (that|this|it|the question) mean|what do you mean|"
+        r"i don'?t (understand|get it|get what you mean)( (that|this|it|the question|what you mean))?[.!?]*$|"
+        r"(i'?m )?not sure what (you|that|this|it) means?|(i'?m|i am) (a bit |a little |so |really )?confused|"
+        r"(this|that|it) is confusing|(that'?s|it'?s) confusing|(can|could) you (explain|clarify|rephrase)|"
+        r"explain (that|this|it|please)[.!?]*$|(what'?s|what is) the meaning of)")),
+    ("asking_question", re.compile(
+        r"^(what|why|how|who|when|where|which|does|do|is|are|can|could|should|would)\b.*\?$")),
+]
+
+# --- Tier 2: nearest-centroid over MiniLM embeddings ---
+INTENT_EXEMPLARS = {
+    "direct_answer": [
+        "Not true", "Somewhat true", "Certainly true",
+        "I'd say somewhat true", "Definitely certainly true", "It's not true for them",
+    ],
+    "confirmation": [
+        "Yes that's right", "Yeah, that sounds correct", "Correct", "Yes, go with that",
+        "That's exactly it", "Sure, that works",
+    ],
+    "correction": [
+        "No, I think it's more than that", "Actually it happens a lot more often",
+        "Not really, it's less than you think", "But only at school, not at home",
+        "No, I'd change that answer", "That's not quite right",
+    ],
+    "confused": [
+        "I don't understand the question", "What does that mean?", "I'm not sure what you're asking",
+        "Can you explain that?", "I'm confused", "Could you say that differently?",
+    ],
+    "asking_question": [
+        "Does this include at home?", "Should I count what happens at school?",
+        "Is this about the last six months?", "How often counts as often?",
+        "Do you mean with siblings too?", "Which situations does this cover?",
+    ],
+    "sharing_experience": [
+        "Last week he got really upset when his brother took his toy",
+        "She usually plays on her own at recess",
+        "At school they sometimes fight with other kids",
+        "When we go somewhere new he hides behind me",
+        "She helps her little sister with homework every evening",
+        "He gets headaches before tests",
+    ],
+    "unclear": [
+        "hmm", "I don't know", "maybe", "whatever", "idk", "not sure",
+    ],
+}
+
+_centroid_lock = threading.Lock()
+_centroids: Optional[Tuple[List[str], np.ndarray]] = None
+
+_stats_lock = threading.Lock()
+_tier_hits = {"rules": 0, "centroid": 0, "combined": 0, "llm": 0, "llm_fallback": 0}
+# Combined replies that failed validation (those turns are then counted under "llm")
+_combined_invalid = 0
+
+
+def _record_tier(tier: str):
+    with _stats_lock:
+        _tier_hits[tier] += 1
+
+
+def _record_combined_invalid():
+    global _combined_invalid
+    with _stats_lock:
+        _combined_invalid += 1
+
+
+def get_intent_stats() -> dict:
+    """Per-tier hit counts and rates since process start"""
+    with _stats_lock:
+        hits = dict(_tier_hits)
+        combined_invalid = _combined_invalid
+    total = sum(hits.values())
+    return {
+        "total": total,
+        "hits": hits,
+        "rates": {tier: (count / total if total else 0.0) for tier, count in hits.items()},
+        "combined_invalid": combined_invalid
+    }
+
+
+def normalize_message(text: str) -> str:
+    return re.sub(r"\s+", " ", text.strip().lower().replace("’", "'"))
+
+
+def classify_by_rules(normalized: str) -> Optional[str]:
+    """Tier 1: return a label only when a rule matches unambiguously (expects normalize_message output)"""
+    if not normalized or len(normalized.split()) > 25:
+        return None
+    for label, pattern in INTENT_RULES:
+        if pattern.search(normalized):
+            return label
+    return None
+
+
+def _get_centroids() -> Tuple[List[str], np.ndarray]:
+    global _centroids
+    if _centroids is None:
+        with _centroid_lock:
+            if _centroids is None:
+                from db.vector_store import embed_text  # local import: vector_store pulls in the db layer
+                labels, rows = [], []
+                for label, examples in INTENT_EXEMPLARS.items():
+                    vectors = np.array([embed_text(e) for e in examples], dtype=np.float32)
+                    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+                    centroid = vectors.mean(axis=0)
+                    labels.append(label)
+                    rows.append(centroid / np.linalg.norm(centroid))
+                _centroids = (labels, np.vstack(rows))
+    return _centroids
+
+
+def warm_up_intent_centroids():
+    """Embed the exemplars ahead of the first unmatched turn"""
+    _get_centroids()
+
+
+def classify_by_centroid(embedding, min_similarity: float = CENTROID_MIN_SIMILARITY,
+                         min_margin: float = CENTROID_MIN_MARGIN) -> Optional[str]:
+    """Tier 2: nearest centroid, only if it clears the similarity and margin thresholds"""
+    labels, matrix = _get_centroids()
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    similarities = matrix @ (vector / norm)
+    order = np.argsort(similarities)[::-1]
+    best, runner_up = similarities[order[0]], similarities[order[1]]
+    if best >= min_similarity and best - runner_up >= min_margin:
+        return labels[order[0]]
+    return None
+
+
+class TurnAnalysis(BaseModel):
+    """Schema of the combined intent + analysis reply (core.prompt_builder.build_turn_analysis_prompt)"""
+    intent: Literal["direct_answer", "confirmation", "correction", "confused",
+                    "asking_question", "sharing_experience", "unclear"]
+    suggested_option: Optional[Literal["Not True", "Somewhat True", "Certainly True"]] = None
+    reply: str = ""
+
+    @model_validator(mode="after")
+    def analysis_complete(self):
+        if self.intent in ANALYSIS_INTENTS and (not self.suggested_option or not self.reply.strip()):
+            raise ValueError(f"{self.intent} needs a suggested_option and a reply")
+        return self
+
+
+def parse_turn_analysis(raw: str) -> Optional[TurnAnalysis]:
+    """The JSON object in an LLM reply (code fences and surrounding prose are ignored), or None"""
+    start, end = raw.find("{"), raw.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        return TurnAnalysis.model_validate(json.loads(raw[start:end + 1]))
+    except (ValueError, ValidationError):
+        return None
+
+
+async def classify_locally(turn) -> Optional[str]:
+    """Tiers 1 and 2; None when neither is confident"""
+    label = classify_by_rules(turn.normalized_text)
+    if label:
+        _record_tier("rules")
+        return label
+
+    embedding = await asyncio.to_thread(lambda: turn.embedding)
+    label = await asyncio.to_thread(classify_by_centroid, embedding)
+    if label:
+        _record_tier("centroid")
+    return label
+
+
+async def _fallback_intent(turn, error: LLMUnavailable) -> str:
+    # No LLM within the turn budget: take the nearest centroid even if it is a weak match
+    print(f"[Intent] LLM unavailable, using nearest centroid: {error}")
+    _record_tier("llm_fallback")
+    embedding = await asyncio.to_thread(lambda: turn.embedding)
+    return await asyncio.to_thread(classify_by_centroid, embedding, -1.0, 0.0) or "unclear"
+
+
+async def classify_by_llm(turn) -> str:
+    """Tier 3: the intent prompt"""
+    prompt = build_intent_prompt(turn.chat_history, formatted_history=turn.recent_history)
+    try:
+        raw_response = (await query_llm(prompt)).strip().lower()
+    except LLMUnavailable as e:
+        return await _fallback_intent(turn, e)
+    _record_tier("llm")
 
     for label in INTENT_LABELS:
         if label in raw_response:
             return label
     return "unclear"
 
-def build_intent_prompt(chat_history: List[Dict[str, str]]) -> str:
+
+async def detect_user_intent(turn) -> str:
+    """
+    Classifies what the user is doing in the latest message of a TurnContext.
+    Returns one of: direct_answer, confirmation, correction, confused, asking_question, sharing_experience, unclear
+
+    Tries local rules first, then the embedding centroids, and only calls the LLM when both are unsure.
+    """
+    return await classify_locally(turn) or await classify_by_llm(turn)
+
+
+async def detect_and_analyze(turn, analysis_prompt: Optional[Callable[[], str]]) -> Tuple[str, Optional[TurnAnalysis]]:
+    """
+    Like detect_user_intent, but when the LLM is needed it asks for intent, suggested option and
+    reply in one call (analysis_prompt builds that prompt). Returns (intent, analysis); analysis is
+    None when the intent came from another tier, in which case the caller makes its own analysis
+    call. A reply that does not match TurnAnalysis falls back to the intent prompt.
+    Without analysis_prompt this is detect_user_intent (two calls, the analysis one streamable).
+    """
+    label = await classify_locally(turn)
+    if label:
+        return label, None
+    if not COMBINED_TURN_ANALYSIS or analysis_prompt is None:
+        return await classify_by_llm(turn), None
+
+    try:
+        raw_response = await query_llm(analysis_prompt())
+    except LLMUnavailable as e:
+        return await _fallback_intent(turn, e), None
+    analysis = parse_turn_analysis(raw_response)
+    if analysis is None:
+        print(f"[Intent] Combined analysis did not match the schema, using the intent prompt: {raw_response[:200]!r}")
+        _record_combined_invalid()
+        return await classify_by_llm(turn), None
+    _record_tier("combined")
+    return analysis.intent, analysis
+
+def build_intent_prompt(chat_history: List[Dict[str, str]], formatted_history: Optional[str] = None) -> str:
     last_user_msg = chat_history[-1]["content"]
-    formatted_history = "\n".join([
-        f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history[-4:]
-    ])
+    if formatted_history is None:
+        formatted_history = "\n".join([
+            f"{msg['role'].capitalize()}: {msg['content']}" for msg in chat_history[-4:]
+        ])
 
     return f"""
 You are an intent classification expert.
@@ -53,4 +302,4 @@ Here is the conversation:
 User's latest message: "{last_user_msg}"
 
 What is the user's intent? Reply with just the label (e.g., correction).
-"""
\ No newline at end of file
+"""